@@ -0,0 +1,287 @@
+"""Per-account admission control for IMAP checks.
+
+``AccountGovernor`` caps how many checks run against one Gmail account at once,
+across every worker process on the host, and queues the rest. ``AccountGuard``
+adds a circuit breaker on top: an account whose login was rejected is skipped
+with exponential backoff instead of paying for a TLS handshake and LOGIN that
+will fail again. Breaker state is mirrored into the ``account_health`` table so
+all workers agree and the dashboard can show which mailboxes are dead.
+"""
+import asyncio
+import fcntl
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+import check_results
+import config
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS account_health (
+    email VARCHAR(255) NOT NULL PRIMARY KEY,
+    failures INT NOT NULL DEFAULT 0,
+    open_until DATETIME NULL,
+    last_error VARCHAR(32) NULL,
+    last_success DATETIME NULL,
+    last_failure DATETIME NULL
+)"""
+
+UPSERT = """INSERT INTO account_health (email, failures, open_until, last_error, last_success, last_failure)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE failures = VALUES(failures), open_until = VALUES(open_until),
+    last_error = VALUES(last_error), last_success = VALUES(last_success), last_failure = VALUES(last_failure)"""
+
+_table_ready = False
+
+
+def ensure_table(cur):
+    global _table_ready
+    if not _table_ready:
+        cur.execute(CREATE_TABLE)
+        _table_ready = True
+
+
+class AccountBusy(Exception):
+    pass
+
+
+class AccountGovernor:
+    """At most ``max_per_account`` concurrent holders per account, shared by all processes.
+
+    Each account hashes to a bucket of ``max_per_account`` bytes in a lock file and a
+    slot is a POSIX record lock on one of those bytes. Record locks belong to the
+    process, so slots taken by this process are also tracked locally to keep its own
+    threads apart. The kernel drops the locks if a worker dies mid-check.
+    """
+
+    def __init__(self, path, max_per_account=None, buckets=65536):
+        self.max_per_account = max_per_account or config.ACCOUNT_MAX_CONCURRENT_CHECKS
+        self.buckets = buckets
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._held = {}        # bucket -> set of slot numbers held by this process
+        self._lock = threading.Lock()
+
+    def _bucket(self, account):
+        return zlib.crc32(account.lower().encode('utf-8')) % self.buckets
+
+    def try_acquire(self, account):
+        bucket = self._bucket(account)
+        with self._lock:
+            held = self._held.setdefault(bucket, set())
+            for slot in range(self.max_per_account):
+                if slot in held:
+                    continue
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, bucket * self.max_per_account + slot)
+                except OSError:
+                    continue
+                held.add(slot)
+                return bucket, slot
+        return None
+
+    def release(self, token):
+        bucket, slot = token
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, bucket * self.max_per_account + slot)
+            held = self._held.get(bucket)
+            held.discard(slot)
+            if not held:
+                del self._held[bucket]
+
+    def acquire(self, account, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            token = self.try_acquire(account)
+            if token is not None:
+                return token
+            if time.monotonic() >= deadline:
+                raise AccountBusy(account)
+            time.sleep(0.05)
+
+    async def acquire_async(self, account, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            token = self.try_acquire(account)
+            if token is not None:
+                return token
+            if time.monotonic() >= deadline:
+                raise AccountBusy(account)
+            await asyncio.sleep(0.05)
+
+    @contextmanager
+    def slot(self, account, timeout):
+        token = self.acquire(account, timeout)
+        try:
+            yield
+        finally:
+            self.release(token)
+
+
+class _State:
+    __slots__ = ("failures", "open_until", "last_error", "last_success", "last_failure", "trial", "dirty")
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.last_error = None
+        self.last_success = None
+        self.last_failure = None
+        self.trial = False
+        self.dirty = False
+
+
+def _to_datetime(ts):
+    return datetime.fromtimestamp(ts).replace(microsecond=0) if ts else None
+
+
+def _to_ts(value):
+    return value.timestamp() if value else None
+
+
+class AccountGuard:
+    """Governor slot + auth-failure circuit breaker around one account check.
+
+    After ``n`` consecutive rejected logins the account is skipped for
+    ``base * 2**(n-1)`` seconds (capped at ``max_backoff``). Once that passes, a
+    single trial check goes through; success closes the breaker, another rejection
+    doubles the wait. Network errors are recorded for health reporting but do not
+    open the breaker.
+    """
+
+    def __init__(self, governor, base_backoff=None, max_backoff=None, queue_timeout=None):
+        self.governor = governor
+        self.base_backoff = base_backoff or config.BREAKER_BASE_BACKOFF
+        self.max_backoff = max_backoff or config.BREAKER_MAX_BACKOFF
+        self.queue_timeout = queue_timeout if queue_timeout is not None else config.ACCOUNT_QUEUE_TIMEOUT
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, account):
+        return self._states.setdefault(account.lower(), _State())
+
+    def before(self, account):
+        """Return a ``skipped`` status if the breaker is open, else None and let the check run."""
+        now = time.time()
+        with self._lock:
+            state = self._state(account)
+            if state.open_until > now:
+                return check_results.skipped_status(account, "circuit_open", round(state.open_until - now))
+            if state.failures:
+                if state.trial:
+                    return check_results.skipped_status(account, "circuit_open", 0)
+                state.trial = True
+        return None
+
+    def after(self, account, status):
+        now = time.time()
+        with self._lock:
+            state = self._state(account)
+            state.trial = False
+            state.dirty = True
+            if status.get('type') == 'valid':
+                state.failures = 0
+                state.open_until = 0.0
+                state.last_error = None
+                state.last_success = now
+            elif status.get('type') in ('invalid', 'timeout'):
+                reason = status.get('reason') or status['type']
+                state.last_error = reason
+                state.last_failure = now
+                if reason == 'auth':
+                    state.failures += 1
+                    state.open_until = now + min(self.base_backoff * 2 ** (state.failures - 1), self.max_backoff)
+        return status
+
+    def run(self, account, check):
+        skipped = self.before(account)
+        if skipped:
+            return skipped
+        status = check_results.skipped_status(account, "busy")
+        try:
+            with self.governor.slot(account, self.queue_timeout):
+                status = check()
+        except AccountBusy:
+            pass
+        return self.after(account, status)
+
+    async def run_async(self, account, check):
+        skipped = self.before(account)
+        if skipped:
+            return skipped
+        status = check_results.skipped_status(account, "busy")
+        try:
+            token = await self.governor.acquire_async(account, self.queue_timeout)
+        except AccountBusy:
+            return self.after(account, status)
+        try:
+            status = await check()
+        finally:
+            self.governor.release(token)
+        return self.after(account, status)
+
+    def reset(self, account):
+        with self._lock:
+            self._states.pop(account.lower(), None)
+
+    def load(self, cur, accounts):
+        """Adopt breaker state other workers wrote for ``accounts`` if it is newer than ours."""
+        if not accounts:
+            return
+        ensure_table(cur)
+        placeholders = ','.join(['%s'] * len(accounts))
+        cur.execute(f"""SELECT email, failures, open_until, last_error, last_success, last_failure
+                        FROM account_health WHERE email IN ({placeholders})""", tuple(accounts))
+        with self._lock:
+            for email, failures, open_until, last_error, last_success, last_failure in cur.fetchall():
+                state = self._state(email)
+                changed_at = max(_to_ts(last_success) or 0, _to_ts(last_failure) or 0)
+                if state.dirty or changed_at <= max(state.last_success or 0, state.last_failure or 0):
+                    continue
+                state.failures = failures
+                state.open_until = _to_ts(open_until) or 0.0
+                state.last_error = last_error
+                state.last_success = _to_ts(last_success)
+                state.last_failure = _to_ts(last_failure)
+
+    def save(self, cur, accounts):
+        """Write back the state of ``accounts`` that changed since the last save; the caller commits."""
+        rows = []
+        with self._lock:
+            for account in accounts:
+                state = self._states.get(account.lower())
+                if state is None or not state.dirty:
+                    continue
+                state.dirty = False
+                rows.append((account.lower(), state.failures, _to_datetime(state.open_until), state.last_error,
+                             _to_datetime(state.last_success), _to_datetime(state.last_failure)))
+        if rows:
+            ensure_table(cur)
+            cur.executemany(UPSERT, sorted(rows))
+
+
+def health_status(failures, open_until, last_error, last_success, last_failure, now=None):
+    now = now or datetime.now()
+    if open_until and open_until > now:
+        return "suspended"
+    if failures:
+        return "failing"
+    if last_error and (not last_success or (last_failure and last_failure > last_success)):
+        return "degraded"
+    if last_success:
+        return "healthy"
+    return "unknown"
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_guard():
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = AccountGuard(AccountGovernor(config.ACCOUNT_SLOTS_PATH))
+    return _guard
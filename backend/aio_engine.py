@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+import account_guard
+import batch_check
+import check_results
+import config
+import imap_fetch
+import metrics
+from aio_imap import AsyncIMAPAuthError, AsyncIMAPClient
+
+FOLDERS = [("INBOX", "INBOX"), ("[Gmail]/Spam", "SPAM")]
+
+
+class AsyncCheckEngine:
+    """Runs account checks as coroutines on one event loop in a background thread.
+
+    Produces the same result shape as ``check_email_status`` but holds hundreds of
+    IMAP conversations with a single thread. ``concurrency`` bounds how many
+    accounts are checked at once. Flask handlers call the synchronous ``check`` /
+    ``run_batch`` wrappers, which block only the calling worker thread.
+    """
+
+    def __init__(self, concurrency=None, client_factory=AsyncIMAPClient):
+        self.concurrency = concurrency or config.ASYNC_CHECK_CONCURRENCY
+        self.client_factory = client_factory
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=self._run, name="aio-check-engine", daemon=True)
+        self._ready = threading.Event()
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _scan(self, client, folder, search_text, limit):
+        with metrics.phase("select_folder"):
+            await client.select_folder(folder)
+        criteria = ['ALL'] if not search_text else ['FROM', search_text]
+        with metrics.phase("search"):
+            uids = (await client.search(criteria))[-limit:]
+        if not uids:
+            return []
+        with metrics.phase("fetch_headers"):
+            headers = await client.fetch(uids, imap_fetch.HEADER_ITEMS)
+        results, by_section = imap_fetch.plan_previews(headers)
+        for section, members in by_section.items():
+            with metrics.phase("fetch_body"):
+                bodies = await client.fetch([uid for uid, _ in members],
+                                            imap_fetch.section_items(section, config.IMAP_PREVIEW_BYTES))
+            imap_fetch.apply_bodies(results, members, bodies)
+        return [check_results.preview_email(uid, folder, data) for uid, data in sorted(results.items())]
+
+    async def _scan_own_connection(self, email, password, folder, search_text, limit):
+        async with self.client_factory() as client:
+            with metrics.phase("imap_login"):
+                await client.login(email, password)
+            return await self._scan(client, folder, search_text, limit)
+
+    async def _gather_folders(self, scans):
+        """Run the folder scans together; if one fails, cancel the others before raising.
+
+        A bare gather would leave a sibling scan running with its IMAP connection
+        open, and nothing would ever retrieve its exception.
+        """
+        tasks = [asyncio.ensure_future(scan) for scan in scans]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # Waits for each client's __aexit__ to close its connection, and collects every outcome
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def check_account(self, email, password, search_text, timeout=None, limit=10):
+        # The governor slot is taken before the engine semaphore so queued accounts don't hold one
+        return await account_guard.get_guard().run_async(
+            email, lambda: self._check_account(email, password, search_text, timeout, limit))
+
+    async def _check_account(self, email, password, search_text, timeout, limit):
+        timeout = timeout or config.BATCH_CHECK_ACCOUNT_TIMEOUT
+        async with self._semaphore:
+            try:
+                if config.IMAP_PARALLEL_FOLDERS:
+                    found = await asyncio.wait_for(self._gather_folders([
+                        self._scan_own_connection(email, password, folder, search_text, limit)
+                        for folder, _ in FOLDERS]), timeout)
+                else:
+                    async def scan_both():
+                        async with self.client_factory() as client:
+                            with metrics.phase("imap_login"):
+                                await client.login(email, password)
+                            return [await self._scan(client, folder, search_text, limit) for folder, _ in FOLDERS]
+                    found = await asyncio.wait_for(scan_both(), timeout)
+            except asyncio.TimeoutError:
+                metrics.inc("check_failures_total", {"reason": "timeout"})
+                return batch_check.timeout_result(email)
+            except AsyncIMAPAuthError as e:
+                print(f"Async login rejected for {email} : {e}")
+                metrics.inc("check_failures_total", {"reason": "auth"})
+                return check_results.invalid_status(email, reason="auth")
+            except Exception as e:
+                print(f"Async check failed for {email} : {e}")
+                metrics.inc("check_failures_total", {"reason": type(e).__name__})
+                return check_results.invalid_status(email)
+        received_list = [{"folder": name, "emails": emails} for (_, name), emails in zip(FOLDERS, found)]
+        return check_results.build_status(email, received_list)
+
+    async def check_many(self, accounts, search_text, timeout=None):
+        return await asyncio.gather(*[self.check_account(email, password, search_text, timeout)
+                                      for email, password in accounts])
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def check(self, email, password, search_text):
+        return self.submit(self.check_account(email, password, search_text)).result()
+
+    def run_batch(self, accounts, search_text, check_fn=None, timeout=None):
+        """Drop-in for ``batch_check.run_batch``; ``check_fn`` is ignored."""
+        return self.submit(self.check_many(accounts, search_text, timeout)).result()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = AsyncCheckEngine()
+    return _engine
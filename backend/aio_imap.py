@@ -0,0 +1,188 @@
+import asyncio
+import re
+import ssl
+
+from imapclient.response_parser import parse_fetch_response
+
+import config
+
+_untagged_numbered = re.compile(rb'(\d+) ([A-Z-]+)(?: (.*))?$')
+_untagged_plain = re.compile(rb'([A-Z-]+)(?: (.*))?$')
+_literal = re.compile(rb'\{(\d+)\}$')
+_response_code = re.compile(rb'\[(UIDVALIDITY|UIDNEXT) (\d+)\]')
+_atom = re.compile(r'^[A-Za-z0-9:*,.\-]+$')
+
+
+class AsyncIMAPError(Exception):
+    pass
+
+
+class AsyncIMAPAuthError(AsyncIMAPError):
+    pass
+
+
+class _Literal:
+    def __init__(self, data):
+        self.data = data
+
+
+def _arg(value):
+    """Encode one command argument as an atom, quoted string or literal."""
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if _atom.match(value):
+        return value.encode('ascii')
+    try:
+        raw = value.encode('ascii')
+    except UnicodeEncodeError:
+        return _Literal(value.encode('utf-8'))
+    if b'\r' in raw or b'\n' in raw:
+        return _Literal(raw)
+    return b'"' + raw.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+
+class AsyncIMAPClient:
+    """Minimal asyncio IMAP4rev1 client covering what the checker needs.
+
+    Supports LOGIN, SELECT, UID SEARCH, UID FETCH and LOGOUT. Untagged FETCH data is
+    collected in the same shape imaplib produces, so imapclient's response parser
+    turns it into the same ENVELOPE/BODYSTRUCTURE objects the synchronous path sees.
+    """
+
+    def __init__(self, host=None, port=None, timeout=None, use_ssl=None):
+        self.host = host or config.IMAP_HOST
+        self.port = port or config.IMAP_PORT
+        self.use_ssl = config.IMAP_SSL if use_ssl is None else use_ssl
+        self.timeout = timeout if timeout is not None else config.IMAP_TIMEOUT
+        self._reader = None
+        self._writer = None
+        self._tag = 0
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.logout()
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context, limit=1 << 20), self.timeout)
+        greeting = await self._readline()
+        if not greeting.startswith(b'* OK') and not greeting.startswith(b'* PREAUTH'):
+            raise AsyncIMAPError(f"Unexpected greeting: {greeting!r}")
+
+    async def _readline(self):
+        line = await asyncio.wait_for(self._reader.readuntil(b'\r\n'), self.timeout)
+        return line[:-2]
+
+    async def _read_untagged(self, line, untagged):
+        match = _untagged_numbered.match(line)
+        if match:
+            kind, data = match.group(2), match.group(1)
+            if match.group(3) is not None:
+                data = data + b' ' + match.group(3)
+        else:
+            match = _untagged_plain.match(line)
+            if not match:
+                return
+            kind, data = match.group(1), match.group(2)
+        for code, value in _response_code.findall(data or b''):
+            untagged.setdefault(code, []).append(value)
+        # Same layout as imaplib: (line-with-literal-marker, literal) tuples, then the tail line
+        while data is not None and _literal.search(data):
+            size = int(_literal.search(data).group(1))
+            literal = await asyncio.wait_for(self._reader.readexactly(size), self.timeout)
+            untagged.setdefault(kind, []).append((data, literal))
+            data = await self._readline()
+        untagged.setdefault(kind, []).append(data)
+
+    async def command(self, *args):
+        self._tag += 1
+        tag = b'A%04d' % self._tag
+        pieces = [tag]
+        literals = []
+        for value in args:
+            value = _arg(value) if not isinstance(value, bytes) else value
+            if isinstance(value, _Literal):
+                pieces.append(b'{%d}' % len(value.data))
+                literals.append((b' '.join(pieces), value.data))
+                # Arguments after a literal continue on the same line, space-separated
+                pieces = [b'']
+            else:
+                pieces.append(value)
+
+        untagged = {}
+        for head, data in literals:
+            self._writer.write(head + b'\r\n')
+            await self._writer.drain()
+            while True:
+                line = await self._readline()
+                if line.startswith(b'+'):
+                    break
+                if line.startswith(tag):
+                    raise AsyncIMAPError(line.decode('utf-8', 'replace'))
+                if line.startswith(b'* '):
+                    await self._read_untagged(line[2:], untagged)
+            self._writer.write(data)
+        self._writer.write(b' '.join(pieces) + b'\r\n')
+        await self._writer.drain()
+
+        while True:
+            line = await self._readline()
+            if line.startswith(tag + b' '):
+                status = line[len(tag) + 1:]
+                if not status.startswith(b'OK'):
+                    raise AsyncIMAPError(status.decode('utf-8', 'replace'))
+                return untagged
+            if line.startswith(b'* '):
+                await self._read_untagged(line[2:], untagged)
+
+    async def login(self, username, password):
+        try:
+            await self.command(b'LOGIN', username, password)
+        except AsyncIMAPError as e:
+            # A tagged NO to LOGIN means the credentials were rejected
+            if str(e).startswith('NO'):
+                raise AsyncIMAPAuthError(str(e)) from None
+            raise
+
+    async def select_folder(self, folder, readonly=False):
+        untagged = await self.command(b'EXAMINE' if readonly else b'SELECT', folder)
+        info = {}
+        if b'EXISTS' in untagged:
+            info[b'EXISTS'] = int(untagged[b'EXISTS'][-1])
+        for key in (b'UIDVALIDITY', b'UIDNEXT'):
+            if key in untagged:
+                info[key] = int(untagged[key][-1])
+        return info
+
+    async def search(self, criteria):
+        if any(not str(c).isascii() for c in criteria):
+            criteria = [b'CHARSET', b'UTF-8'] + list(criteria)
+        untagged = await self.command(b'UID', b'SEARCH', *criteria)
+        uids = []
+        for line in untagged.get(b'SEARCH', []):
+            if line:
+                uids.extend(int(u) for u in line.split())
+        return sorted(uids)
+
+    async def fetch(self, uids, items):
+        if not uids:
+            return {}
+        message_set = ','.join(str(u) for u in uids).encode('ascii')
+        item_list = b'(' + b' '.join(i.encode('ascii') for i in items) + b')'
+        untagged = await self.command(b'UID', b'FETCH', message_set, item_list)
+        return parse_fetch_response(untagged.get(b'FETCH', []), True, True)
+
+    async def logout(self):
+        if self._writer is None:
+            return
+        try:
+            await asyncio.wait_for(self.command(b'LOGOUT'), 5)
+        except Exception:
+            pass
+        finally:
+            self._writer.close()
+            self._writer = None
@@ -1,21 +1,39 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
-from flask_mysqldb import MySQL
 from functools import wraps
 from werkzeug.security import generate_password_hash
 from werkzeug.security import check_password_hash
-from datetime import datetime
-from imapclient import IMAPClient
-from email import policy
-from email.parser import BytesParser
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import imaplib 
-import os, jwt
+from imapclient.exceptions import LoginError
+import os, json, jwt, queue, time
 #import datetime
 # Load .env
 load_dotenv()
 
+import account_guard
+import aio_engine
+import batch_check
+import campaigns
+import check_results
 import config
+import exports
+from db_pool import PooledMySQL
+import idle_watch
+import imap_fetch
+import imap_pool
+import jobs
+import mailbox_cache
+import metrics
+import observations
+import placement_stats
+import preview
+import response_cache
+import seed_import
+import session_cache
+import static_assets
 
 app = Flask(__name__, static_folder="../frontend/build", static_url_path="/")
 CORS(app)
@@ -25,15 +43,80 @@ app.config['MYSQL_HOST'] = config.MYSQL_HOST
 app.config['MYSQL_USER'] = config.MYSQL_USER
 app.config['MYSQL_PASSWORD'] = config.MYSQL_PASSWORD
 app.config['MYSQL_DB'] = config.MYSQL_DB
+app.config['MYSQL_PORT'] = config.MYSQL_PORT
 
-mysql = MySQL()
+# Pooled stand-in for flask_mysqldb.MySQL; mysql.connection borrows a connection per app context
+mysql = PooledMySQL()
 mysql.init_app(app)
 
+_schema_ready = False
+
+@app.before_request
+def ensure_schema():
+    # CREATE TABLE commits implicitly in MySQL, so the app's own tables are created once per process
+    # here, on a separate connection, rather than lazily inside a request's write transaction
+    global _schema_ready
+    if not _schema_ready:
+        with mysql.borrow() as conn:
+            cur = conn.cursor()
+            placement_stats.ensure_tables(cur)
+            observations.ensure_table(cur)
+            account_guard.ensure_table(cur)
+            campaigns.ensure_tables(cur)
+            cur.close()
+        _schema_ready = True
+
+@app.before_request
+def start_background_schedulers():
+    if config.CAMPAIGN_SCHEDULER_ENABLED:
+        campaigns.start_scheduler(mysql, check_account)
+
+if config.METRICS_ENABLED:
+    metrics.gauge("db_pool_in_use", lambda: mysql.pool.stats()["in_use"])
+    metrics.gauge("db_pool_opened", lambda: mysql.pool.stats()["opened"])
+
+    @app.before_request
+    def start_request_metrics():
+        metrics.start_flusher()
+        g._metrics_trace = metrics.start_trace()
+
+    @app.after_request
+    def record_response_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exception):
+        token = g.pop("_metrics_trace", None)
+        if token is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.finish_trace(token, route, request.method, g.pop("_metrics_status", 500))
+
 @app.route("/")
 @app.route("/admin")
 @app.route("/user/detail/<int:id>")
 def serve(id = None):
-    return send_from_directory(app.static_folder, "index.html")
+    return send_asset("index.html")
+
+# Replaces Flask's built-in static view: precompressed variants and cache headers from the in-memory manifest
+@app.endpoint("static")
+def send_asset(filename):
+    asset = static_assets.get_manifest(app.static_folder).get(filename)
+    if asset is None:
+        # Added after this worker built its manifest
+        return app.send_static_file(filename)
+    encoding, path = asset.choose(request.accept_encodings)
+    response = send_file(path, mimetype=asset.content_type, etag=f"{asset.etag}-{encoding}" if encoding else asset.etag)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if asset.immutable:
+        response.headers["Cache-Control"] = f"public, max-age={config.STATIC_IMMUTABLE_MAX_AGE}, immutable"
+    elif filename == "index.html":
+        response.headers["Cache-Control"] = "no-cache"
+    else:
+        response.headers["Cache-Control"] = f"public, max-age={config.STATIC_MAX_AGE}"
+    return response
 
 def get_user_id_from_token(token):
     ip = request.remote_addr
@@ -45,62 +128,92 @@ def get_user_id_from_token(token):
         data = jwt.decode(token,  ip + user_agent, algorithms=["HS256"])
         return data['user_id']
     except:
-        return jsonify({'error': 'Invalid token'}), 401
+        return None
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization', None)
-        user_id = get_user_id_from_token(token)      
+        # The signature is what binds a token to the client's IP + User-Agent, so it is checked on
+        # every request; only the MySQL session lookup is cached
+        user_id = get_user_id_from_token(token)
+        cache = session_cache.get_cache()
+        session = cache.get(token) if user_id is not None else None
 
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT session_token FROM users WHERE id=%s", (user_id,))
-        user = cur.fetchone()
-        cur.close()
+        if session is None:
+            # Read the version before the lookup so a concurrent logout can't be cached over
+            version = cache.counter.value()
+
+            cur = mysql.connection.cursor()
+            cur.execute("SELECT session_token, is_admin FROM users WHERE id=%s", (user_id,))
+            user = cur.fetchone()
+            cur.close()
+
+            if not user or user[0] != token:
+                return jsonify({'error': 'Session expired (another login detected)'}), 403
 
-        if not user or user[0] != token:
-            return jsonify({'error': 'Session expired (another login detected)'}), 403
+            session = {"user_id": user_id, "is_admin": user[1]}
+            cache.put(token, session, version)
 
+        g.user_id = session["user_id"]
+        g.is_admin = session["is_admin"]
         return f(*args, **kwargs)
     return decorated
 
+def cached_response(f):
+    # Goes under @token_required: bodies are cached per user + query string, 304 when the ETag still matches
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not config.RESPONSE_CACHE_ENABLED:
+            return f(*args, **kwargs)
+        cache = response_cache.get_cache()
+        key = (request.path, g.user_id, request.query_string)
+        entry = cache.get(key)
+        if entry is None:
+            # Read the version before the queries so a write during them can't be cached over
+            version = cache.counter.value()
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = response_cache.Entry(response.get_data(), response.mimetype)
+            cache.put(key, entry, version)
+        response = app.response_class(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Authorization")
+        return response.make_conditional(request)
+    return decorated
+
 ################## API FOR  DASHBOARD ###############################
 @app.route('/api/emails', methods=['GET'])
 @token_required
+@cached_response
 def get_emails():
 
-    token = request.headers.get('Authorization', None)
-    ip = request.remote_addr
-    user_agent = request.headers.get('User-Agent')
-    if not token:
-        return jsonify({'error': 'Token is missing'}), 401
-
-    try:
-        data = jwt.decode(token,  ip + user_agent, algorithms=["HS256"])
-        user_id = data['user_id']
-    except:
-        return jsonify({'error': 'Invalid token'}), 401       
+    user_id = g.user_id
+    # Keyset paging on id: ?after=<next_cursor>&limit=N, first page of 10 by default
+    after, limit = exports.keyset_args(request.args, default_limit=10)
 
     cur = mysql.connection.cursor()
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    user = cur.fetchone()
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    cur.execute("SELECT id,email FROM check_email_address WHERE user_id = %s ORDER BY id ASC LIMIT 10", (user_id,))
+    placement_stats.ensure_tables(cur)
+    cur.execute("""SELECT a.id, a.email, IFNULL(c.inbox, 0), IFNULL(c.spam, 0) FROM check_email_address a
+                   LEFT JOIN placement_address_counters c ON c.address_id = a.id
+                   WHERE a.user_id = %s AND a.id > %s ORDER BY a.id ASC LIMIT %s""", (user_id, after, limit))
     address_info = cur.fetchall()
 
     #Query 2: Overall email stats
-    cur.execute("""SELECT sum_inbox, sum_spam, ROUND((sum_inbox / (sum_inbox + sum_spam)) * 100, 1) AS total_percent FROM ( SELECT SUM(inbox) AS sum_inbox, SUM(spam) AS sum_spam  FROM email_check_log ) AS totals""")
+    # Totals come from the per-user rollup (one row per user) instead of scanning email_check_log
+    cur.execute("""SELECT sum_inbox, sum_spam, ROUND((sum_inbox / (sum_inbox + sum_spam)) * 100, 1) AS total_percent FROM ( SELECT SUM(inbox) AS sum_inbox, SUM(spam) AS sum_spam  FROM placement_user_counters ) AS totals""")
 
     total_info = cur.fetchone()
     cur.close()
     result = []
     for acc in address_info:
         cleaned_email = acc[1].replace('\r', '').replace('\n', '').strip()
-        result.append({"id": acc[0], "email": cleaned_email})      
+        result.append({"id": acc[0], "email": cleaned_email, "inbox": acc[2], "spam": acc[3]})      
     
-    return jsonify({"status": "OK", "results": result, "total_info":total_info, "is_admin": user[0]})
+    return jsonify({"status": "OK", "results": result, "total_info":total_info, "is_admin": g.is_admin,
+                    "next_cursor": exports.next_cursor(address_info, limit)})
 
 
 def check_email_status(gmail_email, app_password, from_email_or_name):
@@ -109,33 +222,26 @@ def check_email_status(gmail_email, app_password, from_email_or_name):
     # List of folders to search
     folders = ["INBOX", "[Gmail]/Spam"]
 
-    def short_date(date):
-        
-        try:
-            if date is None:
-                return ""
-            now = datetime.now()
-            diff = now - date
-            if diff.total_seconds() < 60:
-                return "Just now"
-            elif diff.total_seconds() < 3600:
-                return f"{int(diff.total_seconds() // 60)} minutes ago"
-            elif diff.total_seconds() < 86400:
-                return f"{int(diff.total_seconds() // 3600)} hours ago"
-            else:
-                return f"{diff.days} days ago"
-        except Exception as e:
-            return "Unknown"
-        
     def find_email():
         try:
             
             def fetch_emails(client, folder, search_text, limit):
-                client.select_folder(folder)
                 criteria = ['ALL'] if not search_text else ['FROM', search_text]
-                uids = client.search(criteria)
+                if config.MAILBOX_CACHE_ENABLED:
+                    # Only UIDs we have not parsed before are fetched from the server
+                    return mailbox_cache.sync_folder(client, gmail_email, folder, search_text, criteria, limit, fetch_uids)
+                with metrics.phase("select_folder"):
+                    client.select_folder(folder)
+                with metrics.phase("search"):
+                    uids = client.search(criteria)
                 uids = uids[-limit:]  # take last `limit` emails
-                messages = client.fetch(uids, ['ENVELOPE', 'X-GM-LABELS'])
+                return fetch_uids(client, folder, uids)
+
+            def fetch_uids(client, folder, uids):
+                if config.IMAP_FETCH_MODE == "preview":
+                    return fetch_preview_emails(client, folder, uids)
+                with metrics.phase("fetch_headers"):
+                    messages = client.fetch(uids, ['ENVELOPE', 'X-GM-LABELS', 'X-GM-MSGID'])
                 results = []
                 for uid, data in messages.items():
                     envelope = data[b'ENVELOPE']
@@ -145,26 +251,15 @@ def check_email_status(gmail_email, app_password, from_email_or_name):
 
                     labels = [l.decode() for l in data.get(b'X-GM-LABELS', [])]
         
-                    # Fetch full raw email for body parsing
-                    raw_data = client.fetch([uid], ['RFC822'])[uid][b'RFC822']
-                    msg = BytesParser(policy=policy.default).parsebytes(raw_data)
-                    
-                    # Extract plain text and html bodies
-                    text_body = None
+                    # Fetch full raw email and pull a bounded preview out of it
+                    with metrics.phase("fetch_rfc822"):
+                        raw_data = client.fetch([uid], ['RFC822'])[uid][b'RFC822']
+                    with metrics.phase("mime_parse"):
+                        text_body = preview.extract_preview(raw_data)
                     html_body = None
-                    if msg.is_multipart():
-                        for part in msg.walk():
-                            ct = part.get_content_type()
-                            if ct == "text/plain" and text_body is None:
-                                text_body = part.get_content()
-                            elif ct == "text/html" and html_body is None:
-                                html_body = part.get_content()
-                    else:
-                        if msg.get_content_type() == "text/plain":
-                            text_body = msg.get_content()
-                        elif msg.get_content_type() == "text/html":
-                            html_body = msg.get_content()
                     results.append({
+                        "uid": uid,
+                        "message_key": check_results.message_key(envelope, data.get(b'X-GM-MSGID')),
                         "folder": folder,
                         "date": envelope.date,
                         "sender": sender,
@@ -176,59 +271,132 @@ def check_email_status(gmail_email, app_password, from_email_or_name):
                     })
                 return results
                         
-            with IMAPClient('imap.gmail.com', port=993, ssl=True) as client:
-                client.login(gmail_email, app_password)
-                
-                inbox_emails = fetch_emails(client, "INBOX", from_email_or_name, 10)
-                spam_emails = fetch_emails(client, "[Gmail]/Spam", from_email_or_name, 10)
-                
-                all_emails = inbox_emails + spam_emails
-                # Sort combined by date (newest first)
-                all_emails.sort(key=lambda x: x['date'], reverse=True)
-
-                return [{"folder": "INBOX", "emails": inbox_emails}, {"folder": "SPAM", "emails": spam_emails}]
+            def fetch_preview_emails(client, folder, uids):
+                # One batched FETCH for headers + structure, one for a bounded slice of the text part
+                results = []
+                for uid, data in imap_fetch.fetch_previews(client, uids).items():
+                    results.append(check_results.preview_email(uid, folder, data))
+                return results
+
+            def scan_folder(folder):
+                # Reuse an authenticated session for this account when one is pooled
+                with imap_pool.get_pool().session(gmail_email, app_password) as client:
+                    return fetch_emails(client, folder, from_email_or_name, 10)
+
+            if config.IMAP_PARALLEL_FOLDERS:
+                # Each folder gets its own session so INBOX and Spam are searched at the same time
+                with ThreadPoolExecutor(max_workers=len(folders)) as executor:
+                    # Run in copies of this context so both folders' phases land in the request trace
+                    inbox_future = executor.submit(metrics.copy_context().run, scan_folder, "INBOX")
+                    spam_future = executor.submit(metrics.copy_context().run, scan_folder, "[Gmail]/Spam")
+                    inbox_emails = inbox_future.result()
+                    spam_emails = spam_future.result()
+            else:
+                with imap_pool.get_pool().session(gmail_email, app_password) as client:
+                    inbox_emails = fetch_emails(client, "INBOX", from_email_or_name, 10)
+                    spam_emails = fetch_emails(client, "[Gmail]/Spam", from_email_or_name, 10)
 
+            all_emails = inbox_emails + spam_emails
+            # Sort combined by date (newest first)
+            all_emails.sort(key=lambda x: x['date'], reverse=True)
+
+            return [{"folder": "INBOX", "emails": inbox_emails}, {"folder": "SPAM", "emails": spam_emails}]
+
+        except LoginError as e:
+            print(f"IMAP login rejected for {gmail_email} : {e}")
+            metrics.inc("check_failures_total", {"reason": "auth"})
+            return "auth"
         except imaplib.IMAP4.error as e:
             print(f"IMAP error occurred while accessing folder : {e}")
+            metrics.inc("check_failures_total", {"reason": "imap"})
+            return False
+        except imap_pool.SessionTimeout as e:
+            print(f"IMAP session pool exhausted : {e}")
+            metrics.inc("check_failures_total", {"reason": "imap"})
             return False
         except Exception as e:
             print(f"Unexpected error while accessing folder : {e}")
+            metrics.inc("check_failures_total", {"reason": type(e).__name__})
             return False
 
-    # Loop through each folder
-    results = []
-    # Check each folder for the email
-    # results = [{"inbox": 0, "spam": 0, "not_found": 0, "diff_time": "", "text": "", "sender": ""}]
-    inbox_count = 0
-    spam_count = 0  
-        
     received_list = find_email()  # Pass the folder variable here
 
+    if received_list == "auth":
+        return check_results.invalid_status(gmail_email, reason="auth")
     if received_list == False:
-        return {'results':[], 'inbox': 0, 'spam': 0, 'not_found': 1, 'type': 'invalid'}
-
-    for received in received_list:
-        email_count = 0
-        for email in received['emails']:
-            email_count += 1
-            result = {}
-            result["type"] = "inbox" if received['folder'] == "INBOX" else "spam"
-            result["diff_time"] = short_date(email['date'])
-            result["date"] = email['date']
-            MAX_SAFE_SIZE = 35
-            content = email['text_body'] or ''
-            if len(content) > MAX_SAFE_SIZE:
-                content = content[:MAX_SAFE_SIZE] + "..."
-            result["text"] = content
-            result["subject"] = email['subject']
-            result["sender_email"] = email['sender']
-            result["sender_name"] = email['sender_name']
-            results.append(result)            
-        # Count emails in each folder
-        inbox_count += email_count if received['folder'] == "INBOX" else 0
-        spam_count += email_count if received['folder'] == "SPAM" else 0
-
-    return {'results': results, 'email': gmail_email, 'inbox': inbox_count, 'spam': spam_count, 'not_found': 0 if inbox_count + spam_count > 0 else 1, 'type': 'valid'}
+        return check_results.invalid_status(gmail_email)
+
+    return check_results.build_status(gmail_email, received_list)
+
+def guarded_check(gmail_email, app_password, from_email_or_name):
+    # Per-account concurrency cap + auth-failure circuit breaker around the threaded check
+    return account_guard.get_guard().run(
+        gmail_email, lambda: check_email_status(gmail_email, app_password, from_email_or_name))
+
+def check_account(gmail_email, app_password, from_email_or_name):
+    if config.CHECK_ENGINE == "asyncio":
+        return aio_engine.get_engine().check(gmail_email, app_password, from_email_or_name)
+    return guarded_check(gmail_email, app_password, from_email_or_name)
+
+def perform_check(user_id, account_email, from_name_or_email):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT id, password FROM check_email_address WHERE email = %s", (account_email,))
+    account_email_info = cur.fetchone()
+    guard = account_guard.get_guard()
+    guard.load(cur, [account_email])
+    cur.close()
+    # The IMAP check takes seconds; don't keep a pooled connection idle through it
+    mysql.release()
+
+    # for acc in address_info:
+    # Check email status for each account
+    status_list = check_account(account_email, account_email_info[1], from_name_or_email)
+
+    cur = mysql.connection.cursor()
+    placement_stats.record_results(cur, [(user_id, account_email_info[0], status_list)], from_name_or_email)
+    guard.save(cur, [account_email])
+    mysql.connection.commit()
+    cur.close()
+    response_cache.invalidate()
+    return status_list
+
+def perform_batch_check(user_id, emails, from_name_or_email):
+    cur = mysql.connection.cursor()
+    placeholders = ", ".join(["%s"] * len(emails))
+    cur.execute(f"SELECT id, email, password FROM check_email_address WHERE email IN ({placeholders})", tuple(emails))
+    accounts = {}
+    for address_id, email, password in cur.fetchall():
+        accounts.setdefault(email, (address_id, password))
+
+    known = [e for e in emails if e in accounts]
+    guard = account_guard.get_guard()
+    guard.load(cur, known)
+    cur.close()
+    # A batch can run for minutes; the connection goes back to the pool until the results are written
+    mysql.release()
+    runner = aio_engine.get_engine() if config.CHECK_ENGINE == "asyncio" else batch_check
+    status_list = runner.run_batch([(e, accounts[e][1]) for e in known], from_name_or_email, guarded_check)
+
+    cur = mysql.connection.cursor()
+    # One multi-row INSERT for the whole batch; timed-out and skipped accounts are not logged
+    placement_stats.record_results(cur, [(user_id, accounts[status['email']][0], status) for status in status_list],
+                                   from_name_or_email)
+    guard.save(cur, known)
+    mysql.connection.commit()
+    cur.close()
+    response_cache.invalidate()
+
+    by_email = {status['email']: status for status in status_list}
+    return [by_email.get(e) or {'results': [], 'email': e, 'inbox': 0, 'spam': 0, 'not_found': 1, 'type': 'unknown'}
+            for e in emails]
+
+def batch_emails(data):
+    emails = [e for e in dict.fromkeys(data.get("emails") or []) if e]
+    if not emails:
+        return None, (jsonify({'status': 'ERROR', 'message': 'Missing emails'}), 400)
+    if len(emails) > config.BATCH_CHECK_MAX_ACCOUNTS:
+        return None, (jsonify({'status': 'ERROR', 'message': f'At most {config.BATCH_CHECK_MAX_ACCOUNTS} emails per batch'}), 400)
+    return emails, None
 
 @app.route('/api/check', methods=['POST'])
 @token_required
@@ -238,48 +406,455 @@ def check_email():
     from_name_or_email = data.get("search")
     account_email = data.get("email")
 
-    user_id = get_user_id_from_token(request.headers.get('Authorization'))
+    user_id = g.user_id
+
+    status_list = perform_check(user_id, account_email, from_name_or_email)
+    return jsonify({"status": "OK", "results": status_list})
+
+@app.route('/api/check/batch', methods=['POST'])
+@token_required
+def check_email_batch():
+
+    data = request.json or {}
+    emails, error = batch_emails(data)
+    if error:
+        return error
+
+    user_id = g.user_id
+
+    results = perform_batch_check(user_id, emails, data.get("search"))
+    return jsonify({"status": "OK", "results": results})
+
+################## API FOR CHECK JOBS ###############################
+# Jobs run on a background worker pool so a slow mailbox never holds a gunicorn worker
+def run_check_job(payload):
+    with app.app_context():
+        return perform_check(payload['user_id'], payload['email'], payload['search'])
+
+def run_batch_check_job(payload):
+    with app.app_context():
+        return perform_batch_check(payload['user_id'], payload['emails'], payload['search'])
+
+def run_import_job(payload):
+    rows = [tuple(row) for row in payload['rows']]
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        report, candidates = seed_import.screen_rows(cur, payload['user_id'], rows)
+        cur.close()
+        # Login validation can take minutes for a large upload; don't hold a connection through it
+        mysql.release()
+        candidates = seed_import.validate_candidates(rows, report, candidates)
+        cur = mysql.connection.cursor()
+        try:
+            seed_import.insert_accounts(cur, payload['user_id'], rows, report, candidates)
+            mysql.connection.commit()
+        except Exception:
+            mysql.connection.rollback()
+            raise
+        finally:
+            cur.close()
+    response_cache.invalidate()
+    return {"summary": seed_import.summarize(report), "results": report}
+
+JOB_HANDLERS = {"check": run_check_job, "batch": run_batch_check_job, "import": run_import_job}
+
+def owned_job(job_id):
+    user_id = g.user_id
+    job = jobs.get_queue().get(job_id)
+    if not job or job['owner_id'] != user_id:
+        return None
+    return job
+
+@app.route('/api/check/jobs', methods=['POST'])
+@token_required
+def submit_check_job():
+
+    data = request.json or {}
+    user_id = g.user_id
+
+    if data.get("emails") is not None:
+        emails, error = batch_emails(data)
+        if error:
+            return error
+        kind, payload = "batch", {"user_id": user_id, "emails": emails, "search": data.get("search")}
+    elif data.get("email"):
+        kind, payload = "check", {"user_id": user_id, "email": data.get("email"), "search": data.get("search")}
+    else:
+        return jsonify({'status': 'ERROR', 'message': 'Missing email'}), 400
+
+    jobs.start_workers(JOB_HANDLERS)
+    job_id = jobs.get_queue().submit(kind, payload, owner_id=user_id)
+    return jsonify({"status": "OK", "job_id": job_id}), 202
+
+@app.route('/api/check/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_check_job(job_id):
+    job = owned_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({"status": "OK", "job": jobs.public_view(job)})
+
+@app.route('/api/check/jobs/<job_id>/stream', methods=['GET'])
+@token_required
+def stream_check_job(job_id):
+    job = owned_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    job_queue = jobs.get_queue()
+
+    def events(job):
+        deadline = time.monotonic() + config.JOB_STREAM_MAX_SECONDS
+        since = None
+        while job is not None:
+            if job['updated_at'] != since:
+                since = job['updated_at']
+                yield f"event: {job['status']}\ndata: {jobs.dumps(jobs.public_view(job))}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if job['status'] in jobs.FINISHED or time.monotonic() >= deadline:
+                return
+            job = jobs.wait_for_update(job_queue, job_id, since, 15)
+
+    return Response(events(job), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+################## API FOR WATCH (IMAP IDLE) ###############################
+# Opt-in: holds IDLE connections for the lifetime of the stream, so clients stop polling /api/check
+@app.route('/api/watch/stream', methods=['GET'])
+@token_required
+def watch_stream():
+    if not config.IDLE_WATCH_ENABLED:
+        return jsonify({'error': 'Watch mode is disabled'}), 404
+
+    emails = [e for e in dict.fromkeys((request.args.get("emails") or "").split(",")) if e]
+    if not emails:
+        return jsonify({'status': 'ERROR', 'message': 'Missing emails'}), 400
 
     cur = mysql.connection.cursor()
-    cur.execute("SELECT id, password FROM check_email_address WHERE email = %s", (account_email,))
-    account_email_info = cur.fetchone()
-    
-    # for acc in address_info:
-    # Check email status for each account
-    status_list = check_email_status(account_email, account_email_info[1], from_name_or_email)
+    placeholders = ", ".join(["%s"] * len(emails))
+    cur.execute(f"SELECT email, password FROM check_email_address WHERE email IN ({placeholders})", tuple(emails))
+    accounts = dict(cur.fetchall())
+    cur.close()
+    if not accounts:
+        return jsonify({'error': 'No matching accounts'}), 404
+
+    registry = idle_watch.get_registry()
+    try:
+        subscription = registry.subscribe(accounts, request.args.get("search"))
+    except idle_watch.WatchLimitError as e:
+        return jsonify({'status': 'ERROR', 'message': str(e)}), 429
+
+    def events():
+        deadline = time.monotonic() + config.IDLE_STREAM_MAX_SECONDS
+        try:
+            yield f"event: ready\ndata: {jobs.dumps({'emails': sorted(accounts)})}\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    event = subscription.events.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: arrival\ndata: {jobs.dumps(event)}\n\n"
+        finally:
+            registry.unsubscribe(subscription)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+################## API FOR PLACEMENT HISTORY ###############################
+def parse_history_time(value, default):
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+@app.route('/api/stats/history', methods=['GET'])
+@token_required
+def placement_history():
+    user_id = g.user_id
+
+    now = datetime.now()
+    end = parse_history_time(request.args.get("to"), now)
+    start = parse_history_time(request.args.get("from"), now - timedelta(days=7))
+    if start is None or end is None or start >= end:
+        return jsonify({'status': 'ERROR', 'message': 'Invalid from/to range'}), 400
+
+    bucket = placement_stats.pick_bucket(start, end, request.args.get("bucket", "auto"))
+    if (end - start) / placement_stats.BUCKETS[bucket][2] > config.HISTORY_MAX_POINTS:
+        return jsonify({'status': 'ERROR', 'message': f'Range too large for {bucket} buckets'}), 400
+
+    target_user = request.args.get("user_id", type=int) or user_id
+    address_id = request.args.get("address_id", type=int)
+
+    cur = mysql.connection.cursor()
+    if address_id is not None:
+        cur.execute("SELECT user_id FROM check_email_address WHERE id = %s", (address_id,))
+        owner = cur.fetchone()
+        target_user = owner[0] if owner else None
+    if target_user != user_id:
+        cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
+        user = cur.fetchone()
+        if not user or not user[0]:
+            cur.close()
+            return jsonify({'error': 'Forbidden'}), 403
+
+    points = placement_stats.history(cur, start, end, bucket, user_id=target_user, address_id=address_id)
+    cur.close()
+    return jsonify({"status": "OK", "bucket": bucket, "from": start.isoformat(), "to": end.isoformat(), "results": points})
+
+@app.route('/api/accounts/health', methods=['GET'])
+@token_required
+def account_health():
+    target_user = request.args.get("user_id", type=int) or g.user_id
+    if target_user != g.user_id and not g.is_admin:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    cur = mysql.connection.cursor()
+    account_guard.ensure_table(cur)
+    cur.execute("""SELECT a.id, a.email, h.failures, h.open_until, h.last_error, h.last_success, h.last_failure
+                   FROM check_email_address a LEFT JOIN account_health h ON h.email = a.email
+                   WHERE a.user_id = %s ORDER BY a.id""", (target_user,))
+    rows = cur.fetchall()
+    cur.close()
+
+    now = datetime.now()
+    results = []
+    summary = {}
+    for address_id, email, failures, open_until, last_error, last_success, last_failure in rows:
+        status = account_guard.health_status(failures, open_until, last_error, last_success, last_failure, now)
+        summary[status] = summary.get(status, 0) + 1
+        results.append({"id": address_id, "email": email, "status": status, "failures": failures or 0,
+                        "retry_at": open_until.isoformat() if open_until and open_until > now else None,
+                        "last_error": last_error,
+                        "last_success": last_success.isoformat() if last_success else None,
+                        "last_failure": last_failure.isoformat() if last_failure else None})
+    return jsonify({"status": "OK", "summary": summary, "results": results})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not config.METRICS_ENABLED:
+        return jsonify({'status': 'ERROR', 'message': 'Metrics are disabled'}), 404
+    if config.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {config.METRICS_TOKEN}":
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/db/pool', methods=['GET'])
+@token_required
+def db_pool_stats():
+    return jsonify({"status": "OK", "results": mysql.pool.stats()})
+
+################## API FOR EXPORT ###############################
+# Streamed from a server-side cursor in batches, so memory stays flat however large the table is
+EXPORTS = {
+    "users": ("SELECT id, username, is_admin FROM users WHERE id > %s {owner} ORDER BY id", "id"),
+    "addresses": ("SELECT id, user_id, email FROM check_email_address WHERE id > %s {owner} ORDER BY id", "user_id"),
+    "check_logs": ("SELECT id, user_id, address_id, inbox, spam, checked_at FROM email_check_log WHERE id > %s {owner} ORDER BY id", "user_id"),
+}
+
+@app.route('/api/export/<kind>', methods=['GET'])
+@token_required
+def export_rows(kind):
+    if kind not in EXPORTS:
+        return jsonify({'status': 'ERROR', 'message': 'Unknown export'}), 404
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in exports.FORMATS:
+        return jsonify({'status': 'ERROR', 'message': 'format must be ndjson or csv'}), 400
+
+    sql, owner_column = EXPORTS[kind]
+    params = [request.args.get("after", default=0, type=int)]
+    target_user = request.args.get("user_id", type=int)
+    if not g.is_admin:
+        # Non-admins only ever export their own rows
+        if target_user not in (None, g.user_id):
+            return jsonify({'error': 'Forbidden'}), 403
+        target_user = g.user_id
+    owner = ""
+    if target_user is not None:
+        owner = f"AND {owner_column} = %s"
+        params.append(target_user)
+    if kind == "check_logs":
+        for arg, op in (("from", ">="), ("to", "<")):
+            if not request.args.get(arg):
+                continue
+            value = parse_history_time(request.args.get(arg), None)
+            if value is None:
+                return jsonify({'status': 'ERROR', 'message': f'Invalid {arg} date, expected ISO 8601'}), 400
+            owner += f" AND checked_at {op} %s"
+            params.append(value)
+
+    body = exports.encode(mysql.stream(sql.format(owner=owner), params), fmt)
+    return Response(body, mimetype=exports.FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={kind}.{fmt}",
+                             "X-Accel-Buffering": "no"})
+
+################## API FOR CAMPAIGNS ###############################
+def campaign_view(row, address_ids):
+    campaign_id, user_id, name, search_text, interval, enabled, next_run_at, last_run_at, last_result, skipped_runs = row
+    return {"id": campaign_id, "user_id": user_id, "name": name, "search": search_text,
+            "interval_seconds": interval, "enabled": bool(enabled),
+            "next_run_at": next_run_at.isoformat() if next_run_at else None,
+            "last_run_at": last_run_at.isoformat() if last_run_at else None,
+            "last_result": json.loads(last_result) if last_result else None,
+            "skipped_runs": skipped_runs, "address_ids": address_ids}
+
+def load_campaigns(cur, where, params):
+    cur.execute(f"""SELECT id, user_id, name, search_text, interval_seconds, enabled, next_run_at, last_run_at,
+                    last_result, skipped_runs FROM placement_campaigns WHERE {where} ORDER BY id""", params)
+    rows = cur.fetchall()
+    if not rows:
+        return []
+    ids = [row[0] for row in rows]
+    cur.execute(f"SELECT campaign_id, address_id FROM placement_campaign_accounts WHERE campaign_id IN ({','.join(['%s'] * len(ids))})",
+                tuple(ids))
+    addresses = {}
+    for campaign_id, address_id in cur.fetchall():
+        addresses.setdefault(campaign_id, []).append(address_id)
+    return [campaign_view(row, sorted(addresses.get(row[0], []))) for row in rows]
+
+def campaign_fields(cur, data, owner_id):
+    """Validate a create/update body; returns (fields, error_response)."""
+    if not isinstance(data, dict):
+        return None, (jsonify({'status': 'ERROR', 'message': 'Expected a JSON object'}), 400)
+    name = (data.get('name') or '').strip()
+    search = (data.get('search') or '').strip()
+    interval = data.get('interval_seconds')
+    raw_ids = data.get('address_ids') or []
+    # bool is a subclass of int, so true/false would otherwise pass as 1/0
+    if not isinstance(raw_ids, list) or not all((isinstance(a, int) and not isinstance(a, bool))
+                                                or (isinstance(a, str) and a.isdigit()) for a in raw_ids):
+        return None, (jsonify({'status': 'ERROR', 'message': 'address_ids must be a list of ids'}), 400)
+    if interval is not None and (isinstance(interval, bool) or not isinstance(interval, int)):
+        return None, (jsonify({'status': 'ERROR', 'message': 'interval_seconds must be an integer'}), 400)
+    enabled = data.get('enabled', True)
+    # bool("false") is True, so only real JSON booleans are accepted
+    if not isinstance(enabled, bool):
+        return None, (jsonify({'status': 'ERROR', 'message': 'enabled must be true or false'}), 400)
+    address_ids = list(dict.fromkeys(int(a) for a in raw_ids))
+    if not name or not search or not address_ids or interval is None:
+        return None, (jsonify({'status': 'ERROR', 'message': 'Missing fields'}), 400)
+    if interval < config.CAMPAIGN_MIN_INTERVAL:
+        return None, (jsonify({'status': 'ERROR', 'message': f'interval_seconds must be at least {config.CAMPAIGN_MIN_INTERVAL}'}), 400)
+    if len(address_ids) > config.CAMPAIGN_MAX_ACCOUNTS:
+        return None, (jsonify({'status': 'ERROR', 'message': f'At most {config.CAMPAIGN_MAX_ACCOUNTS} accounts per campaign'}), 400)
+    cur.execute(f"SELECT COUNT(*) FROM check_email_address WHERE user_id = %s AND id IN ({','.join(['%s'] * len(address_ids))})",
+                (owner_id, *address_ids))
+    if cur.fetchone()[0] != len(address_ids):
+        return None, (jsonify({'status': 'ERROR', 'message': 'Unknown address_ids'}), 400)
+    return {"name": name, "search": search, "interval": interval, "address_ids": address_ids,
+            "enabled": enabled}, None
+
+def owned_campaign(cur, campaign_id):
+    cur.execute("SELECT user_id FROM placement_campaigns WHERE id = %s", (campaign_id,))
+    row = cur.fetchone()
+    if not row or (row[0] != g.user_id and not g.is_admin):
+        return None
+    return row[0]
+
+@app.route('/api/campaigns', methods=['GET'])
+@token_required
+def list_campaigns():
+    cur = mysql.connection.cursor()
+    campaigns.ensure_tables(cur)
+    results = load_campaigns(cur, "user_id = %s", (g.user_id,))
+    cur.close()
+    return jsonify({"status": "OK", "results": results})
 
-    cur.execute("INSERT INTO email_check_log (user_id, address_id, inbox, spam, checked_at) VALUES (%s, %s, %s, %s, %s)",
-                (user_id, account_email_info[0], status_list['inbox'], status_list['spam'], datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+@app.route('/api/campaigns', methods=['POST'])
+@token_required
+def create_campaign():
+    cur = mysql.connection.cursor()
+    campaigns.ensure_tables(cur)
+    fields, error = campaign_fields(cur, request.get_json() or {}, g.user_id)
+    if error:
+        cur.close()
+        return error
+    cur.execute("""INSERT INTO placement_campaigns (user_id, name, search_text, interval_seconds, enabled, next_run_at, created_at)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                (g.user_id, fields['name'], fields['search'], fields['interval'], fields['enabled'],
+                 campaigns.first_run(fields['interval']), datetime.now()))
+    campaign_id = cur.lastrowid
+    cur.executemany("INSERT INTO placement_campaign_accounts (campaign_id, address_id) VALUES (%s, %s)",
+                    [(campaign_id, a) for a in fields['address_ids']])
     mysql.connection.commit()
+    results = load_campaigns(cur, "id = %s", (campaign_id,))
     cur.close()
-    return jsonify({"status": "OK", "results": status_list})
+    return jsonify({"status": "OK", "results": results[0]}), 201
+
+@app.route('/api/campaigns/<int:campaign_id>', methods=['PUT'])
+@token_required
+def update_campaign(campaign_id):
+    cur = mysql.connection.cursor()
+    campaigns.ensure_tables(cur)
+    owner_id = owned_campaign(cur, campaign_id)
+    if owner_id is None:
+        cur.close()
+        return jsonify({'status': 'ERROR', 'message': 'Campaign not found'}), 404
+    fields, error = campaign_fields(cur, request.get_json() or {}, owner_id)
+    if error:
+        cur.close()
+        return error
+    # An in-flight run keeps its lease and finishes; the new schedule applies from its next slot
+    cur.execute("""UPDATE placement_campaigns SET name = %s, search_text = %s, interval_seconds = %s, enabled = %s
+                   WHERE id = %s""", (fields['name'], fields['search'], fields['interval'], fields['enabled'], campaign_id))
+    cur.execute("DELETE FROM placement_campaign_accounts WHERE campaign_id = %s", (campaign_id,))
+    cur.executemany("INSERT INTO placement_campaign_accounts (campaign_id, address_id) VALUES (%s, %s)",
+                    [(campaign_id, a) for a in fields['address_ids']])
+    mysql.connection.commit()
+    results = load_campaigns(cur, "id = %s", (campaign_id,))
+    cur.close()
+    return jsonify({"status": "OK", "results": results[0]})
+
+@app.route('/api/campaigns/<int:campaign_id>', methods=['DELETE'])
+@token_required
+def delete_campaign(campaign_id):
+    cur = mysql.connection.cursor()
+    campaigns.ensure_tables(cur)
+    if owned_campaign(cur, campaign_id) is None:
+        cur.close()
+        return jsonify({'status': 'ERROR', 'message': 'Campaign not found'}), 404
+    cur.execute("DELETE FROM placement_campaign_accounts WHERE campaign_id = %s", (campaign_id,))
+    cur.execute("DELETE FROM placement_campaigns WHERE id = %s", (campaign_id,))
+    mysql.connection.commit()
+    cur.close()
+    return jsonify({'status': 'OK', 'message': 'Campaign deleted'})
+
+@app.route('/api/campaigns/<int:campaign_id>/run', methods=['POST'])
+@token_required
+def run_campaign_now(campaign_id):
+    cur = mysql.connection.cursor()
+    campaigns.ensure_tables(cur)
+    if owned_campaign(cur, campaign_id) is None:
+        cur.close()
+        return jsonify({'status': 'ERROR', 'message': 'Campaign not found'}), 404
+    # Picked up on the next scheduler poll; a run already in progress is not doubled up
+    cur.execute("UPDATE placement_campaigns SET next_run_at = %s WHERE id = %s", (datetime.now().replace(microsecond=0), campaign_id))
+    mysql.connection.commit()
+    cur.close()
+    return jsonify({'status': 'OK'}), 202
 
 ################## API FOR  USERS MANAGE #################################
 ### get user list for admin
 @app.route('/api/users', methods=['GET'])
 @token_required
+@cached_response
 def get_users():
 
-    token = request.headers.get('Authorization', None)
-    ip = request.remote_addr
-    user_agent = request.headers.get('User-Agent')
-    if not token:
-        return jsonify({'error': 'Token is missing'}), 401
-
-    try:
-        data = jwt.decode(token,  ip + user_agent, algorithms=["HS256"])
-        user_id = data['user_id']
-    except:
-        return jsonify({'error': 'Invalid token'}), 401       
     percent = "%"
+    # Without ?limit= the full list is returned as before
+    after, limit = exports.keyset_args(request.args)
+    page = "WHERE users.id > %s ORDER BY users.id" + (" LIMIT %s" if limit else "")
     cur = mysql.connection.cursor()
+    placement_stats.ensure_tables(cur)
     cur.execute("""SELECT id, username, is_admin, t1.* FROM users LEFT JOIN (
        SELECT   
            user_id,  
-           IFNULL(SUM(inbox), 0) AS inbox,  
-           IFNULL(SUM(spam), 0) AS spam,  
-           IFNULL(SUM(inbox) + SUM(spam), 0) AS total,  
-           CONCAT(ROUND(IFNULL(SUM(inbox) * 100 / NULLIF(SUM(inbox) + SUM(spam), 0), 0), 1), '%') AS ratio FROM email_check_log GROUP BY user_id) AS t1 ON t1.user_id = users.id""")
+           inbox,  
+           spam,  
+           inbox + spam AS total,  
+           CONCAT(ROUND(IFNULL(inbox * 100 / NULLIF(inbox + spam, 0), 0), 1), '%%') AS ratio FROM placement_user_counters) AS t1 ON t1.user_id = users.id """ + page, (after, limit) if limit else (after,))
     rows = cur.fetchall()
 
     column_names = [desc[0] for desc in cur.description]
@@ -299,7 +874,7 @@ def get_users():
     # total_info = cur.fetchone()
     # cur.close()
     #return jsonify(users) 
-    return jsonify({"status": "OK", "results": users})
+    return jsonify({"status": "OK", "results": users, "next_cursor": exports.next_cursor(rows, limit)})
 
 # 🔸 Create User (POST /api/users)
 @app.route('/api/users', methods=['POST'])
@@ -316,6 +891,7 @@ def create_user():
     cur = mysql.connection.cursor()
     cur.execute("INSERT INTO users (username, is_admin, password_hash) VALUES (%s, %s,%s)", (username, is_admin, password_hash))
     mysql.connection.commit()
+    response_cache.invalidate()
 
     user_id = cur.lastrowid
     cur.close()
@@ -337,6 +913,8 @@ def update_user(id):
     cur.execute("UPDATE users SET username=%s, is_admin=%s, password_hash=%s WHERE id=%s", (username, is_admin, password_hash, id))
 
     mysql.connection.commit()
+    session_cache.get_cache().invalidate()
+    response_cache.invalidate()
     cur.close()
 
     return jsonify({'id': id, 'username': username, 'is_admin': is_admin}), 200
@@ -356,6 +934,8 @@ def delete_user(id):
     # Delete user
     cur.execute("DELETE FROM users WHERE id = %s", (id,))
     mysql.connection.commit()
+    session_cache.get_cache().invalidate()
+    response_cache.invalidate()
     cur.close()
 
     return jsonify({'message': 'User deleted'}), 200
@@ -365,19 +945,13 @@ def delete_user(id):
 @token_required
 def get_user_mail(id):
 
-    token = request.headers.get('Authorization', None)
-    ip = request.remote_addr
-    user_agent = request.headers.get('User-Agent')
-    if not token:
-        return jsonify({'error': 'Token is missing'}), 401
-
-    try:
-        data = jwt.decode(token,  ip + user_agent, algorithms=["HS256"])        
-    except:
-        return jsonify({'error': 'Invalid token'}), 401       
 
+    after, limit = exports.keyset_args(request.args)
     cur = mysql.connection.cursor()
-    cur.execute("SELECT id,user_id, email,password FROM check_email_address WHERE user_id = %s", (id,))
+    if limit:
+        cur.execute("SELECT id,user_id, email,password FROM check_email_address WHERE user_id = %s AND id > %s ORDER BY id LIMIT %s", (id, after, limit))
+    else:
+        cur.execute("SELECT id,user_id, email,password FROM check_email_address WHERE user_id = %s AND id > %s ORDER BY id", (id, after))
     rows = cur.fetchall()
 
     column_names = [desc[0] for desc in cur.description]
@@ -392,15 +966,34 @@ def get_user_mail(id):
         mails.append(user)
 
     #return jsonify(mails) 
-    return jsonify({"status": "OK", "results": mails})
+    return jsonify({"status": "OK", "results": mails, "next_cursor": exports.next_cursor(rows, limit)})
+
+# stored per-message results for one seed address, newest first (no IMAP round-trip)
+@app.route('/api/user/mail/<int:address_id>/messages', methods=['GET'])
+@token_required
+def get_user_mail_messages(address_id):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT user_id, email FROM check_email_address WHERE id = %s", (address_id,))
+    address = cur.fetchone()
+    if not address or (address[0] != g.user_id and not g.is_admin):
+        cur.close()
+        return jsonify({'status': 'ERROR', 'message': 'Address not found'}), 404
+    observations.ensure_table(cur)
+    limit = max(1, min(request.args.get("limit", default=50, type=int), 500))
+    results = observations.recent(cur, address_id, request.args.get("folder"), limit)
+    cur.close()
+    return jsonify({"status": "OK", "email": address[1], "results": results})
 
 @app.route('/api/reset_all_data', methods=['GET'])
 @token_required
 def reset_all_data():
     cur = mysql.connection.cursor()
     cur.execute("DELETE FROM email_check_log")
+    cur.execute("DELETE FROM message_observations")
+    placement_stats.rebuild(cur)
     mysql.connection.commit()
     cur.close()
+    response_cache.invalidate()
     return jsonify({"status": "OK"})
 
 # save user mail detail data 
@@ -418,10 +1011,49 @@ def create_user_mail():
     cur = mysql.connection.cursor()
     cur.execute("INSERT INTO check_email_address (email, password,user_id) VALUES (%s, %s,%s)", (email, password,user_id))
     mysql.connection.commit()
+    response_cache.invalidate()
     mail_id = cur.lastrowid
     cur.close()
 
     return jsonify({'status': 'OK', 'results': {'id': mail_id, 'email': email, 'password': password}}), 201
+
+# bulk import seed accounts from a CSV or JSON upload
+@app.route('/api/user/import', methods=['POST'])
+@token_required
+def import_user_mail():
+    target_user = request.args.get("user_id", type=int) or g.user_id
+    if target_user != g.user_id and not g.is_admin:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    upload = request.files.get('file')
+    body = upload.read() if upload else request.get_data()
+    try:
+        rows = seed_import.parse_rows(body, upload.mimetype if upload else request.content_type)
+    except ValueError as e:
+        return jsonify({'status': 'ERROR', 'message': f'Could not parse upload: {e}'}), 400
+    if not rows:
+        return jsonify({'status': 'ERROR', 'message': 'No accounts in upload'}), 400
+    if len(rows) > config.SEED_IMPORT_MAX_ROWS:
+        return jsonify({'status': 'ERROR', 'message': f'At most {config.SEED_IMPORT_MAX_ROWS} accounts per import'}), 400
+
+    if request.args.get("validate", "1") != "0":
+        # Logins are tried on the job workers; poll /api/check/jobs/<job_id> for the report
+        jobs.start_workers(JOB_HANDLERS)
+        job_id = jobs.get_queue().submit("import", {"user_id": target_user, "rows": rows}, owner_id=g.user_id)
+        return jsonify({"status": "OK", "job_id": job_id}), 202
+
+    cur = mysql.connection.cursor()
+    try:
+        report = seed_import.import_accounts(cur, target_user, rows, validate=False)
+        mysql.connection.commit()
+    except Exception as e:
+        mysql.connection.rollback()
+        print(f"Seed import failed : {e}")
+        return jsonify({'status': 'ERROR', 'message': 'Import failed, nothing was saved'}), 500
+    finally:
+        cur.close()
+    response_cache.invalidate()
+    return jsonify({'status': 'OK', 'summary': seed_import.summarize(report), 'results': report}), 201
 # update user mail detail data 
 @app.route('/api/user/<int:id>', methods=['PUT'])
 @token_required
@@ -434,9 +1066,21 @@ def update_user_mail(id):
         return jsonify({'status': 'ERROR', 'message': 'Missing fields'}), 400
 
     cur = mysql.connection.cursor()
+    # Before the UPDATE: the first CREATE TABLE would implicitly commit it on its own
+    account_guard.ensure_table(cur)
+    cur.execute("SELECT email FROM check_email_address WHERE id = %s", (id,))
+    previous = cur.fetchone()
     cur.execute("UPDATE check_email_address SET email = %s, password = %s WHERE id = %s", (email, password, id))
+    # New credentials get a fresh chance instead of waiting out the breaker
+    cur.execute("DELETE FROM account_health WHERE email = %s", (email.lower(),))
     mysql.connection.commit()
     cur.close()
+    account_guard.get_guard().reset(email)
+    response_cache.invalidate()
+    # This worker's cached folders and pooled sessions for the old and new mailbox used the old credentials
+    for account in {email, previous[0]} if previous else {email}:
+        mailbox_cache.get_cache().invalidate(account)
+        imap_pool.get_pool().discard(account)
 
     return jsonify({'status': 'OK', 'results': {'id': id, 'email': email, 'password': password}})
 # delete user mail detail data 
@@ -445,6 +1089,7 @@ def delete_user_mail(id):
     cur = mysql.connection.cursor()
     cur.execute("DELETE FROM check_email_address WHERE id = %s", (id,))
     mysql.connection.commit()
+    response_cache.invalidate()
     cur.close()
     return jsonify({'status': 'OK', 'message': 'User deleted'})
 
@@ -513,12 +1158,13 @@ def login():
 
     cur.execute("UPDATE users SET session_token=%s WHERE id=%s", (token, user_id))
     mysql.connection.commit()
+    session_cache.get_cache().invalidate()
     return jsonify({"token": token})
 
 @app.route("/api/logout", methods=["POST"])
 @token_required
 def logout():
-    user_id = get_user_id_from_token(request.headers.get('Authorization'))
+    user_id = g.user_id
 
     if not user_id:
         return jsonify({"error": "Missing User ID"}), 401
@@ -526,6 +1172,7 @@ def logout():
     cur = mysql.connection.cursor()
     cur.execute("UPDATE users SET session_token = NULL WHERE id = %s", (user_id,))
     mysql.connection.commit()
+    session_cache.get_cache().invalidate()
     cur.close()
 
     return jsonify({"status": "OK", "message": "Logout success"}), 200
@@ -533,6 +1180,30 @@ def logout():
 
 
 
+@app.cli.command("compress-static")
+def compress_static():
+    """Write .br/.gz variants of the frontend build for send_asset (run after npm run build)."""
+    written = static_assets.compress(app.static_folder)
+    print(f"Wrote {written} compressed variants under {app.static_folder}")
+
+
+@app.cli.command("backfill-placement-stats")
+def backfill_placement_stats():
+    """Rebuild the placement counter tables from email_check_log (one-off) and add its missing indexes."""
+    cur = mysql.connection.cursor()
+    for name in placement_stats.ensure_indexes(cur):
+        print(f"Created index {name} on email_check_log")
+    placement_stats.rebuild(cur)
+    mysql.connection.commit()
+    response_cache.invalidate()
+    cur.execute("SELECT COUNT(*) FROM placement_user_counters")
+    users = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM placement_address_counters")
+    addresses = cur.fetchone()[0]
+    cur.close()
+    print(f"Rebuilt placement counters for {users} users and {addresses} addresses")
+
+
 if __name__ == "__main__":
     #app.run(host="0.0.0.0", port=5000, debug=True)
     app.run(host='0.0.0.0', port=8000)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.BATCH_CHECK_WORKERS,
+                                               thread_name_prefix="batch-check")
+    return _executor
+
+
+def timeout_result(email):
+    return {'results': [], 'email': email, 'inbox': 0, 'spam': 0, 'not_found': 1, 'type': 'timeout'}
+
+
+def run_batch(accounts, search_text, check_fn, timeout=None, executor=None):
+    """Run ``check_fn(email, password, search_text)`` for every ``(email, password)`` in ``accounts``.
+
+    Work is fanned out over a shared bounded thread pool. Each account's timeout
+    starts when a worker picks it up, so accounts queued behind slow mailboxes are
+    not penalised. An account that overruns gets a ``type: 'timeout'`` result and
+    is abandoned; its IMAP socket timeout bounds how long the worker stays busy.
+    Results are returned in the same order as ``accounts``.
+    """
+    timeout = timeout or config.BATCH_CHECK_ACCOUNT_TIMEOUT
+    executor = executor or get_executor()
+    started = {}
+
+    def task(index, email, password):
+        started[index] = time.monotonic()
+        return check_fn(email, password, search_text)
+
+    futures = {executor.submit(task, i, email, password): i for i, (email, password) in enumerate(accounts)}
+    results = [None] * len(accounts)
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"Batch check failed for {accounts[index][0]} : {e}")
+                results[index] = {'results': [], 'email': accounts[index][0], 'inbox': 0, 'spam': 0,
+                                  'not_found': 1, 'type': 'invalid'}
+        now = time.monotonic()
+        for future in list(pending):
+            index = futures[future]
+            if index in started and now - started[index] > timeout:
+                future.cancel()
+                pending.discard(future)
+                results[index] = timeout_result(accounts[index][0])
+    return results
@@ -0,0 +1,85 @@
+"""Microbenchmark: bounded preview extraction vs. full BytesParser parse.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_preview --messages 200 --attachment-kb 512
+"""
+import argparse
+import os
+import random
+import time
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+
+import preview
+
+
+def build_corpus(count, attachment_kb, seed=1):
+    rng = random.Random(seed)
+    words = ["deliverability", "campaign", "inbox", "placement", "seed", "report", "héllo", "naïve", "spam"]
+    corpus = []
+    for i in range(count):
+        msg = EmailMessage()
+        msg["From"] = f"Sender {i} <sender{i}@example.com>"
+        msg["To"] = "seed@example.com"
+        msg["Subject"] = f"Test campaign #{i}"
+        text = " ".join(rng.choice(words) for _ in range(2000))
+        msg.set_content(text, cte="quoted-printable" if i % 2 else "base64")
+        msg.add_alternative(f"<html><body><p>{text}</p></body></html>", subtype="html")
+        if attachment_kb:
+            msg.add_attachment(os.urandom(attachment_kb * 1024), maintype="application",
+                               subtype="octet-stream", filename=f"report{i}.bin")
+        corpus.append(msg.as_bytes())
+    return corpus
+
+
+def full_parse(raw):
+    # Mirrors the pre-existing check_email_status body extraction
+    msg = BytesParser(policy=policy.default).parsebytes(raw)
+    text_body = None
+    html_body = None
+    for part in msg.walk():
+        ct = part.get_content_type()
+        if ct == "text/plain" and text_body is None:
+            text_body = part.get_content()
+        elif ct == "text/html" and html_body is None:
+            html_body = part.get_content()
+    return text_body or ""
+
+
+def bench(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in corpus:
+            fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--attachment-kb", type=int, default=256)
+    parser.add_argument("--budget", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.attachment_kb)
+    for raw in corpus[:10]:
+        expected = full_parse(raw)[:35]
+        got = preview.extract_preview(raw, args.budget)[:35]
+        assert got == expected, (got, expected)
+
+    size_mb = sum(len(raw) for raw in corpus) / 1024 / 1024
+    full = bench(full_parse, corpus, args.repeat)
+    bounded = bench(lambda raw: preview.extract_preview(raw, args.budget), corpus, args.repeat)
+    print(f"corpus: {len(corpus)} messages, {size_mb:.1f} MiB")
+    print(f"full BytesParser parse : {full * 1000:8.1f} ms  ({len(corpus) / full:8.0f} msg/s)")
+    print(f"bounded preview        : {bounded * 1000:8.1f} ms  ({len(corpus) / bounded:8.0f} msg/s)")
+    print(f"speedup                : {full / bounded:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Local Gmail IMAP stand-in for benchmarks.
+
+Implements the subset of IMAP4rev1 the checker uses, over plain TCP: LOGIN,
+SELECT/EXAMINE (with UIDVALIDITY/UIDNEXT), UID SEARCH (ALL, FROM, UID ranges,
+CHARSET), UID FETCH (ENVELOPE, BODYSTRUCTURE, BODY.PEEK[n]<0.len>, RFC822,
+X-GM-LABELS, X-GM-MSGID), NOOP and LOGOUT. Every account gets an INBOX and a
+``[Gmail]/Spam`` folder. A fixed delay can be added to each command, with a
+separate one for LOGIN, to imitate Gmail round-trips.
+
+Run standalone to point a dev server at it::
+
+    python -m benchmarks.fake_imap --accounts 20 --messages 50 --latency-ms 40 --port 1143
+"""
+import argparse
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from datetime import datetime, timedelta, timezone
+
+FOLDERS = {"INBOX": "\\Inbox", "[Gmail]/Spam": "\\Spam"}
+PASSWORD = "app-password"
+
+_token = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}|[^\s()]+')
+
+
+def _quote(value):
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _address(name, mailbox, host):
+    return f"(({_quote(name)} NIL {_quote(mailbox)} {_quote(host)}))"
+
+
+def _bodystructure(part, sections, prefix=''):
+    """BODYSTRUCTURE for ``part``; fills ``sections`` with section number -> transfer-encoded body."""
+    if part.is_multipart():
+        children = []
+        for i, child in enumerate(part.iter_parts(), 1):
+            children.append(_bodystructure(child, sections, f"{prefix}.{i}" if prefix else str(i)))
+        return "(" + "".join(children) + f" {_quote(part.get_content_subtype().upper())})"
+    body = part.get_payload().encode('ascii', 'replace')
+    sections[prefix or '1'] = body
+    charset = part.get_content_charset()
+    params = f"({_quote('CHARSET')} {_quote(charset)})" if charset else "NIL"
+    encoding = (part.get('Content-Transfer-Encoding') or '7bit').upper()
+    fields = (f"{_quote(part.get_content_maintype().upper())} {_quote(part.get_content_subtype().upper())} "
+              f"{params} NIL NIL {_quote(encoding)} {len(body)}")
+    if part.get_content_maintype() == 'text':
+        fields += " %d" % body.count(b'\n')
+    return f"({fields})"
+
+
+class Message:
+    def __init__(self, uid, gm_msgid, sender, sender_name, subject, date, body_kb, rng):
+        msg = EmailMessage()
+        msg["From"] = f"{sender_name} <{sender}>"
+        msg["To"] = "seed@example.com"
+        msg["Subject"] = subject
+        msg["Date"] = format_datetime(date)
+        msg["Message-ID"] = make_msgid(domain="bench.local")
+        words = ["deliverability", "placement", "campaign", "inbox", "seed", "report", "offer", "update"]
+        text = " ".join(rng.choice(words) for _ in range(max(1, body_kb * 1024 // 9)))
+        msg.set_content(text)
+        msg.add_alternative(f"<html><body><p>{text}</p></body></html>", subtype="html")
+        self.uid = uid
+        self.gm_msgid = gm_msgid
+        self.sender = sender
+        self.raw = msg.as_bytes()
+        self.sections = {}
+        self.bodystructure = _bodystructure(msg, self.sections)
+        mailbox, host = sender.split("@")
+        self.envelope = (f"({_quote(msg['Date'])} {_quote(subject)} {_address(sender_name, mailbox, host)} "
+                         f"{_address(sender_name, mailbox, host)} {_address(sender_name, mailbox, host)} "
+                         f"{_address(None, 'seed', 'example.com')} NIL NIL NIL {_quote(msg['Message-ID'])})")
+        self.from_header = f"{sender_name} <{sender}>".lower()
+
+
+class Mailbox:
+    def __init__(self, uidvalidity):
+        self.uidvalidity = uidvalidity
+        self.messages = []
+        self.uidnext = 1
+
+    def append(self, message):
+        self.messages.append(message)
+        self.uidnext = message.uid + 1
+
+
+class FakeGmail:
+    """Seeded accounts: ``seed{n}@bench.local`` with INBOX and Spam, shared by every connection."""
+
+    def __init__(self, accounts=10, messages=20, spam_ratio=0.3, body_kb=4, senders=5, seed=1):
+        rng = random.Random(seed)
+        self.accounts = {}
+        now = datetime.now(timezone.utc)
+        gm_msgid = 1_700_000_000_000_000_000
+        for a in range(accounts):
+            boxes = {name: Mailbox(uidvalidity=1000 + a) for name in FOLDERS}
+            for i in range(messages):
+                folder = "[Gmail]/Spam" if rng.random() < spam_ratio else "INBOX"
+                box = boxes[folder]
+                s = rng.randrange(senders)
+                gm_msgid += 1
+                box.append(Message(box.uidnext, gm_msgid, f"sender{s}@campaign{s}.test", f"Campaign {s}",
+                                   f"Newsletter {i} from campaign {s}", now - timedelta(minutes=messages - i),
+                                   body_kb, rng))
+            self.accounts[self.address(a)] = boxes
+
+    @staticmethod
+    def address(index):
+        return f"seed{index}@bench.local"
+
+    def credentials(self):
+        return [(email, PASSWORD) for email in self.accounts]
+
+
+def _parse_set(text, maximum):
+    result = set()
+    for piece in text.split(','):
+        if ':' in piece:
+            lo, hi = piece.split(':')
+            lo = maximum if lo == '*' else int(lo)
+            hi = maximum if hi == '*' else int(hi)
+            result.update(range(min(lo, hi), max(lo, hi) + 1))
+        else:
+            result.add(maximum if piece == '*' else int(piece))
+    return result
+
+
+def _unquote(token):
+    if token.startswith(b'"'):
+        return re.sub(rb'\\(.)', rb'\1', token[1:-1]).decode('utf-8', 'replace')
+    return token.decode('utf-8', 'replace')
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        # Without this, delayed ACKs add ~40ms per round trip and swamp the latency being injected
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.user = None
+        self.box = None
+
+    def send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+    def read_command(self):
+        """Read one command line, pulling in any {n} literals, and return its tokens."""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        tokens = []
+        while True:
+            line = line.rstrip(b'\r\n')
+            literal = re.search(rb'\{(\d+)\}$', line)
+            head = line[:literal.start()] if literal else line
+            tokens.extend(_token.findall(head))
+            if not literal:
+                return tokens
+            self.send(b"+ go ahead\r\n")
+            self.wfile.flush()
+            data = self.rfile.read(int(literal.group(1)))
+            tokens.append(b'"' + data.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"')
+            line = self.rfile.readline()
+
+    def handle(self):
+        server = self.server
+        self.send("* OK [CAPABILITY IMAP4rev1 X-GM-EXT-1 UIDPLUS IDLE] Fake Gmail ready\r\n")
+        while True:
+            tokens = self.read_command()
+            if not tokens:
+                return
+            tag, command, args = tokens[0], tokens[1].upper(), tokens[2:]
+            if server.latency:
+                time.sleep(server.latency)
+            try:
+                done = self.dispatch(command, args)
+            except Exception as e:
+                self.send(tag + f" BAD {e}\r\n".encode())
+                self.wfile.flush()
+                continue
+            self.send(tag + b" " + done.encode() + b"\r\n")
+            self.wfile.flush()
+            if command == b'LOGOUT':
+                return
+
+    def dispatch(self, command, args):
+        gmail = self.server.gmail
+        if command == b'CAPABILITY':
+            self.send("* CAPABILITY IMAP4rev1 X-GM-EXT-1 UIDPLUS IDLE\r\n")
+            return "OK CAPABILITY completed"
+        if command == b'NOOP':
+            return "OK NOOP completed"
+        if command == b'LOGOUT':
+            self.send("* BYE Logging out\r\n")
+            return "OK LOGOUT completed"
+        if command == b'LOGIN':
+            if self.server.login_latency:
+                time.sleep(self.server.login_latency)
+            user, password = _unquote(args[0]), _unquote(args[1])
+            if user not in gmail.accounts or password != PASSWORD:
+                return "NO [AUTHENTICATIONFAILED] Invalid credentials (Failure)"
+            self.user = user
+            return "OK LOGIN completed"
+        if self.user is None:
+            return "BAD Not authenticated"
+        if command in (b'SELECT', b'EXAMINE'):
+            box = gmail.accounts[self.user].get(_unquote(args[0]))
+            if box is None:
+                return "NO [NONEXISTENT] Unknown Mailbox"
+            self.box = box
+            self.send(f"* FLAGS (\\Answered \\Flagged \\Draft \\Deleted \\Seen)\r\n"
+                      f"* {len(box.messages)} EXISTS\r\n* 0 RECENT\r\n"
+                      f"* OK [UIDVALIDITY {box.uidvalidity}] UIDs valid\r\n"
+                      f"* OK [UIDNEXT {box.uidnext}] Predicted next UID\r\n")
+            return f"OK [{'READ-ONLY' if command == b'EXAMINE' else 'READ-WRITE'}] {command.decode()} completed"
+        if command == b'UID' and self.box is not None:
+            sub, rest = args[0].upper(), args[1:]
+            if sub == b'SEARCH':
+                return self.search(rest)
+            if sub == b'FETCH':
+                return self.fetch(rest)
+        return "BAD Command not supported"
+
+    def search(self, args):
+        messages = self.box.messages
+        maximum = messages[-1].uid if messages else 0
+        matches = list(messages)
+        i = 0
+        while i < len(args):
+            key = args[i].upper()
+            if key == b'CHARSET':
+                i += 2
+                continue
+            if key == b'ALL':
+                i += 1
+            elif key == b'FROM':
+                needle = _unquote(args[i + 1]).lower()
+                matches = [m for m in matches if needle in m.from_header]
+                i += 2
+            elif key == b'UID':
+                wanted = _parse_set(args[i + 1].decode(), max(maximum, 1))
+                # "n:*" always includes the highest UID, even when n is larger
+                matches = [m for m in matches if m.uid in wanted]
+                i += 2
+            else:
+                raise ValueError(f"unsupported search key {key!r}")
+        self.send("* SEARCH" + "".join(f" {m.uid}" for m in matches) + "\r\n")
+        return "OK SEARCH completed"
+
+    def fetch(self, args):
+        messages = self.box.messages
+        maximum = messages[-1].uid if messages else 0
+        wanted = _parse_set(args[0].decode(), max(maximum, 1))
+        items = [a.upper() for a in args[1:] if a not in (b'(', b')')]
+        for seq, message in enumerate(messages, 1):
+            if message.uid not in wanted:
+                continue
+            parts = [f"UID {message.uid}".encode()]
+            for item in items:
+                if item == b'ENVELOPE':
+                    parts.append(b"ENVELOPE " + message.envelope.encode())
+                elif item == b'BODYSTRUCTURE':
+                    parts.append(b"BODYSTRUCTURE " + message.bodystructure.encode())
+                elif item == b'X-GM-LABELS':
+                    parts.append(f"X-GM-LABELS ({FOLDERS[self._folder()]})".encode())
+                elif item == b'X-GM-MSGID':
+                    parts.append(f"X-GM-MSGID {message.gm_msgid}".encode())
+                elif item == b'RFC822':
+                    parts.append(b"RFC822 {%d}\r\n" % len(message.raw) + message.raw)
+                elif item == b'FLAGS':
+                    parts.append(b"FLAGS (\\Seen)")
+                elif item.startswith(b'BODY.PEEK[') or item.startswith(b'BODY['):
+                    match = re.match(rb'BODY(?:\.PEEK)?\[([\d.]*)\](?:<(\d+)\.(\d+)>)?', item)
+                    section = match.group(1).decode() or None
+                    data = message.sections.get(section, b'') if section else message.raw
+                    start = int(match.group(2) or 0)
+                    if match.group(3):
+                        data = data[start:start + int(match.group(3))]
+                    name = f"BODY[{section or ''}]" + (f"<{start}>" if match.group(2) else "")
+                    parts.append(name.encode() + b" {%d}\r\n" % len(data) + data)
+            self.send(f"* {seq} FETCH (".encode() + b" ".join(parts) + b")\r\n")
+        return "OK FETCH completed"
+
+    def _folder(self):
+        for name, box in self.server.gmail.accounts[self.user].items():
+            if box is self.box:
+                return name
+        return "INBOX"
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, gmail, host="127.0.0.1", port=0, latency_ms=0, login_latency_ms=0):
+        super().__init__((host, port), Handler)
+        self.gmail = gmail
+        self.latency = latency_ms / 1000
+        self.login_latency = login_latency_ms / 1000
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="fake-imap", daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--body-kb", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--login-latency-ms", type=float, default=0)
+    parser.add_argument("--port", type=int, default=1143)
+    args = parser.parse_args()
+    server = FakeIMAPServer(FakeGmail(args.accounts, args.messages, body_kb=args.body_kb), port=args.port,
+                            latency_ms=args.latency_ms, login_latency_ms=args.login_latency_ms)
+    print(f"Fake IMAP on 127.0.0.1:{server.port} (IMAP_SSL=0); accounts seed0..seed{args.accounts - 1}@bench.local, "
+          f"password {PASSWORD!r}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Recurring placement campaigns: a search term checked against a set of seed accounts on an interval.
+
+Every worker process runs a ``CampaignScheduler`` thread. Due campaigns are
+claimed with a lease (a conditional UPDATE), so each run happens in exactly one
+process. A run's accounts are spread over part of the interval with jitter,
+instead of all being checked at once. Results are buffered and written to
+email_check_log in batches. A campaign that falls behind skips to its next
+future slot instead of queueing every missed run.
+"""
+import heapq
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import account_guard
+import config
+import placement_stats
+import response_cache
+
+CREATE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS placement_campaigns (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        name VARCHAR(255) NOT NULL,
+        search_text VARCHAR(255) NOT NULL,
+        interval_seconds INT NOT NULL,
+        enabled TINYINT(1) NOT NULL DEFAULT 1,
+        next_run_at DATETIME NOT NULL,
+        locked_by VARCHAR(255) NULL,
+        locked_until DATETIME NULL,
+        last_run_at DATETIME NULL,
+        last_result TEXT NULL,
+        skipped_runs INT NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL,
+        KEY idx_placement_campaigns_due (enabled, next_run_at),
+        KEY idx_placement_campaigns_user (user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS placement_campaign_accounts (
+        campaign_id INT NOT NULL,
+        address_id INT NOT NULL,
+        PRIMARY KEY (campaign_id, address_id)
+    )""",
+]
+
+_tables_ready = False
+
+
+def ensure_tables(cur):
+    global _tables_ready
+    if not _tables_ready:
+        for statement in CREATE_TABLES:
+            cur.execute(statement)
+        _tables_ready = True
+
+
+def next_slot(scheduled, interval, now):
+    """First ``scheduled + k * interval`` after ``now``, and how many slots were missed on the way."""
+    if scheduled > now:
+        return scheduled, 0
+    missed = int((now - scheduled).total_seconds() // interval)
+    return scheduled + timedelta(seconds=interval * (missed + 1)), missed
+
+
+def spread_offsets(count, interval):
+    """Start offsets (seconds) for ``count`` accounts: one per equal slot, jittered inside it."""
+    if not count:
+        return []
+    window = min(interval * config.CAMPAIGN_SPREAD_FRACTION, config.CAMPAIGN_MAX_SPREAD)
+    width = window / count
+    return [(i + random.random()) * width for i in range(count)]
+
+
+class ResultBuffer:
+    """Collects check results and finished runs until there is enough to be worth a transaction.
+
+    Rows are ``(user_id, address_id, status, search_text, checked_at)``.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+        self._accounts = set()
+        self._finished = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, row, account):
+        with self._lock:
+            self._rows.append(row)
+            self._accounts.add(account)
+
+    def finish(self, campaign_id, owner, summary):
+        with self._lock:
+            self._finished.append((campaign_id, owner, summary))
+
+    def due(self):
+        with self._lock:
+            pending = len(self._rows) or len(self._finished) or len(self._accounts)
+            return pending and (len(self._rows) >= config.CAMPAIGN_FLUSH_ROWS
+                                or time.monotonic() - self._last_flush >= config.CAMPAIGN_FLUSH_SECONDS)
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            accounts, self._accounts = self._accounts, set()
+            finished, self._finished = self._finished, []
+            self._last_flush = time.monotonic()
+        if not rows and not finished and not accounts:
+            return
+        try:
+            with self.db.borrow() as conn:
+                cur = conn.cursor()
+                by_search = {}
+                for user_id, address_id, status, search_text, checked_at in rows:
+                    group = by_search.setdefault(search_text, [[], checked_at])
+                    group[0].append((user_id, address_id, status))
+                    group[1] = max(group[1], checked_at)
+                for search_text, (results, checked_at) in by_search.items():
+                    placement_stats.record_results(cur, results, search_text, checked_at)
+                account_guard.get_guard().save(cur, sorted(accounts))
+                now = datetime.now()
+                for campaign_id, owner, summary in finished:
+                    cur.execute("""UPDATE placement_campaigns SET locked_by = NULL, locked_until = NULL,
+                                   last_run_at = %s, last_result = %s WHERE id = %s AND locked_by = %s""",
+                                (now, json.dumps(summary), campaign_id, owner))
+                conn.commit()
+                cur.close()
+            if rows:
+                response_cache.invalidate()
+        except Exception as e:
+            print(f"Campaign result flush failed : {e}")
+            with self._lock:
+                # Keep the rows for the next attempt, but never let a dead database grow memory without bound
+                self._rows = (rows + self._rows)[-config.CAMPAIGN_MAX_BUFFER:]
+                self._accounts |= accounts
+                self._finished = finished + self._finished
+
+
+class _Run:
+    def __init__(self, campaign_id, owner, total):
+        self.campaign_id = campaign_id
+        self.owner = owner
+        self.remaining = total
+        self.summary = {"accounts": total, "inbox": 0, "spam": 0, "not_found": 0, "failed": 0, "skipped": 0}
+        self.lock = threading.Lock()
+
+
+class CampaignScheduler:
+    """Claims due campaigns and feeds their accounts to a bounded check pool, spread over time."""
+
+    def __init__(self, db, check_fn):
+        self.db = db
+        self.check_fn = check_fn
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.buffer = ResultBuffer(db)
+        self._executor = ThreadPoolExecutor(max_workers=config.CAMPAIGN_WORKERS, thread_name_prefix="campaign-check")
+        self._pending = []      # heap of (start_at, seq, run, user_id, account)
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="campaign-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_poll:
+                try:
+                    self._claim_due()
+                except Exception as e:
+                    print(f"Campaign scheduler error : {e}")
+                next_poll = now + config.CAMPAIGN_POLL_INTERVAL
+            while self._pending and self._pending[0][0] <= now:
+                _, _, run, user_id, account = heapq.heappop(self._pending)
+                self._executor.submit(self._check, run, user_id, account)
+            if self.buffer.due():
+                self.buffer.flush()
+            wake = min(next_poll, self._pending[0][0] if self._pending else next_poll)
+            self._stop.wait(max(0.05, min(wake - time.monotonic(), 1.0)))
+        self.buffer.flush()
+
+    def _claim_due(self):
+        now = datetime.now()
+        claimed = []
+        with self.db.borrow() as conn:
+            cur = conn.cursor()
+            ensure_tables(cur)
+            cur.execute("""SELECT id, user_id, search_text, interval_seconds, next_run_at FROM placement_campaigns
+                           WHERE enabled = 1 AND next_run_at <= %s AND (locked_until IS NULL OR locked_until < %s)
+                           ORDER BY next_run_at LIMIT %s""", (now, now, config.CAMPAIGN_CLAIM_BATCH))
+            for campaign_id, user_id, search_text, interval, scheduled in cur.fetchall():
+                lease = now + timedelta(seconds=min(interval * config.CAMPAIGN_SPREAD_FRACTION, config.CAMPAIGN_MAX_SPREAD)
+                                        + config.ACCOUNT_QUEUE_TIMEOUT + config.BATCH_CHECK_ACCOUNT_TIMEOUT
+                                        + config.CAMPAIGN_FLUSH_SECONDS + 60)
+                upcoming, missed = next_slot(scheduled, interval, now)
+                # Only one worker's conditional UPDATE matches; overdue slots collapse into this run
+                cur.execute("""UPDATE placement_campaigns SET locked_by = %s, locked_until = %s, next_run_at = %s,
+                               skipped_runs = skipped_runs + %s
+                               WHERE id = %s AND next_run_at = %s AND (locked_until IS NULL OR locked_until < %s)""",
+                            (self.owner, lease, upcoming, missed, campaign_id, scheduled, now))
+                if cur.rowcount == 1:
+                    claimed.append((campaign_id, user_id, search_text, interval))
+            conn.commit()
+
+            for campaign_id, user_id, search_text, interval in claimed:
+                cur.execute("""SELECT a.id, a.email, a.password FROM placement_campaign_accounts ca
+                               JOIN check_email_address a ON a.id = ca.address_id
+                               WHERE ca.campaign_id = %s ORDER BY a.id""", (campaign_id,))
+                accounts = cur.fetchall()
+                account_guard.get_guard().load(cur, [email for _, email, _ in accounts])
+                self._schedule(campaign_id, user_id, search_text, interval, accounts)
+            cur.close()
+
+    def _schedule(self, campaign_id, user_id, search_text, interval, accounts):
+        run = _Run(campaign_id, self.owner, len(accounts))
+        if not accounts:
+            self.buffer.finish(campaign_id, self.owner, run.summary)
+            return
+        start = time.monotonic()
+        for offset, account in zip(spread_offsets(len(accounts), interval), accounts):
+            self._seq += 1
+            heapq.heappush(self._pending, (start + offset, self._seq, run, user_id, (search_text, *account)))
+
+    def _check(self, run, user_id, account):
+        search_text, address_id, email, password = account
+        try:
+            status = self.check_fn(email, password, search_text)
+        except Exception as e:
+            print(f"Campaign check failed for {email} : {e}")
+            status = {'inbox': 0, 'spam': 0, 'not_found': 1, 'type': 'invalid'}
+        if status['type'] not in ('timeout', 'skipped'):
+            self.buffer.add((user_id, address_id, status, search_text, datetime.now().replace(microsecond=0)), email)
+        with run.lock:
+            summary = run.summary
+            if status['type'] == 'skipped':
+                summary['skipped'] += 1
+            elif status['type'] != 'valid':
+                summary['failed'] += 1
+            else:
+                summary['inbox'] += 1 if status['inbox'] else 0
+                summary['spam'] += 1 if status['spam'] else 0
+                summary['not_found'] += status['not_found']
+            run.remaining -= 1
+            done = run.remaining == 0
+        if done:
+            self.buffer.finish(run.campaign_id, run.owner, run.summary)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(db, check_fn):
+    """Start this process's scheduler once; safe to call from every request."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = CampaignScheduler(db, check_fn)
+                _scheduler.start()
+    return _scheduler
+
+
+def first_run(interval):
+    # Random start offset so campaigns created together don't fire on the same tick forever
+    return datetime.now().replace(microsecond=0) + timedelta(seconds=random.uniform(0, min(interval, config.CAMPAIGN_START_JITTER)))
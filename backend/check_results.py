@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import config
+import metrics
+import preview
+
+MAX_SAFE_SIZE = 35
+
+
+def short_date(date):
+    
+    try:
+        if date is None:
+            return ""
+        now = datetime.now()
+        diff = now - date
+        if diff.total_seconds() < 60:
+            return "Just now"
+        elif diff.total_seconds() < 3600:
+            return f"{int(diff.total_seconds() // 60)} minutes ago"
+        elif diff.total_seconds() < 86400:
+            return f"{int(diff.total_seconds() // 3600)} hours ago"
+        else:
+            return f"{diff.days} days ago"
+    except Exception as e:
+        return "Unknown"
+
+
+def safe_text(text):
+    """Body preview as shown in results: at most MAX_SAFE_SIZE characters."""
+    text = text or ''
+    return text[:MAX_SAFE_SIZE] + "..." if len(text) > MAX_SAFE_SIZE else text
+
+
+def message_key(envelope, gm_msgid=None):
+    """Stable id for a message across checks and folder moves: X-GM-MSGID, else the Message-ID header."""
+    if gm_msgid:
+        return f"gm:{gm_msgid}"
+    if envelope is not None and envelope.message_id:
+        return "mid:" + envelope.message_id.decode('utf-8', 'replace').strip()[:240]
+    return None
+
+
+def preview_email(uid, folder, data):
+    """Build a parsed email dict from one ``imap_fetch`` preview entry."""
+    envelope = data['envelope']
+    subject = envelope.subject.decode() if envelope.subject else "(No subject)"
+    sender = envelope.from_[0] if envelope.from_ else None
+    sender_name = sender.name.decode() if sender and sender.name else "(No name)"
+    sender = f"{sender.mailbox.decode()}@{sender.host.decode()}" if sender else ""
+    is_html = data['content_type'] == "text/html"
+    with metrics.phase("mime_parse"):
+        text_body = preview.html_to_text(data['raw_body'], config.PREVIEW_MAX_CHARS) if is_html else data['raw_body']
+    return {
+        "uid": uid,
+        "message_key": message_key(envelope, data.get('gm_msgid')),
+        "folder": folder,
+        "date": envelope.date,
+        "sender": sender,
+        "sender_name": sender_name,
+        "subject": subject,
+        "labels": data['labels'],
+        "text_body": text_body,
+        "html_body": data['raw_body'] if is_html else None
+    }
+
+
+def invalid_status(gmail_email, reason=None):
+    status = {'results':[], 'email': gmail_email, 'inbox': 0, 'spam': 0, 'not_found': 1, 'type': 'invalid'}
+    if reason:
+        status['reason'] = reason
+    return status
+
+
+def skipped_status(gmail_email, reason, retry_after=None):
+    """Result for a check that was never attempted (breaker open or account busy); not logged."""
+    status = {'results':[], 'email': gmail_email, 'inbox': 0, 'spam': 0, 'not_found': 1, 'type': 'skipped',
+              'reason': reason}
+    if retry_after is not None:
+        status['retry_after'] = retry_after
+    return status
+
+
+def build_status(gmail_email, received_list):
+    """Shape ``[{"folder": "INBOX"|"SPAM", "emails": [...]}, ...]`` into the check_email_status result."""
+    results = []
+    inbox_count = 0
+    spam_count = 0  
+
+    for received in received_list:
+        email_count = 0
+        for email in received['emails']:
+            email_count += 1
+            result = {}
+            result["type"] = "inbox" if received['folder'] == "INBOX" else "spam"
+            result["diff_time"] = short_date(email['date'])
+            result["date"] = email['date']
+            result["text"] = safe_text(email['text_body'])
+            result["subject"] = email['subject']
+            result["sender_email"] = email['sender']
+            result["sender_name"] = email['sender_name']
+            result["message_id"] = email.get('message_key')
+            results.append(result)            
+        # Count emails in each folder
+        inbox_count += email_count if received['folder'] == "INBOX" else 0
+        spam_count += email_count if received['folder'] == "SPAM" else 0
+
+    return {'results': results, 'email': gmail_email, 'inbox': inbox_count, 'spam': spam_count, 'not_found': 0 if inbox_count + spam_count > 0 else 1, 'type': 'valid'}
@@ -3,4 +3,131 @@ import os
 MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "root")
-MYSQL_DB = os.getenv("MYSQL_DB", "email_checker")
\ No newline at end of file
+MYSQL_DB = os.getenv("MYSQL_DB", "email_checker")
+MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3306"))
+# Request threads per gunicorn worker (render.yaml passes it to --threads)
+WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))
+# Connection pool, per gunicorn worker process
+# One per request thread and job worker, plus headroom for the campaign scheduler and export streams
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", str(WEB_THREADS + int(os.getenv("JOB_WORKERS", "4")) + 4)))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+MYSQL_POOL_RECYCLE = int(os.getenv("MYSQL_POOL_RECYCLE", "3600"))
+MYSQL_POOL_PING_INTERVAL = int(os.getenv("MYSQL_POOL_PING_INTERVAL", "30"))
+
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+# Only turned off for local stand-ins such as benchmarks/fake_imap.py
+IMAP_SSL = os.getenv("IMAP_SSL", "1") == "1"
+IMAP_TIMEOUT = float(os.getenv("IMAP_TIMEOUT", "30"))
+IMAP_POOL_MAX_PER_ACCOUNT = int(os.getenv("IMAP_POOL_MAX_PER_ACCOUNT", "2"))
+IMAP_POOL_IDLE_TIMEOUT = int(os.getenv("IMAP_POOL_IDLE_TIMEOUT", "300"))
+# Longest a check waits for one of its account's sessions before failing
+IMAP_POOL_CHECKOUT_TIMEOUT = float(os.getenv("IMAP_POOL_CHECKOUT_TIMEOUT", "30"))
+
+# "preview" fetches BODYSTRUCTURE plus a byte range of the first text part; "full" downloads RFC822
+IMAP_FETCH_MODE = os.getenv("IMAP_FETCH_MODE", "preview")
+IMAP_PREVIEW_BYTES = int(os.getenv("IMAP_PREVIEW_BYTES", "2048"))
+PREVIEW_MAX_CHARS = int(os.getenv("PREVIEW_MAX_CHARS", "200"))
+IMAP_PARALLEL_FOLDERS = os.getenv("IMAP_PARALLEL_FOLDERS", "1") == "1"
+
+BATCH_CHECK_WORKERS = int(os.getenv("BATCH_CHECK_WORKERS", "8"))
+BATCH_CHECK_ACCOUNT_TIMEOUT = float(os.getenv("BATCH_CHECK_ACCOUNT_TIMEOUT", "60"))
+BATCH_CHECK_MAX_ACCOUNTS = int(os.getenv("BATCH_CHECK_MAX_ACCOUNTS", "200"))
+
+# Concurrent checks per Gmail account across all workers (each check may hold 2 IMAP sessions)
+ACCOUNT_MAX_CONCURRENT_CHECKS = int(os.getenv("ACCOUNT_MAX_CONCURRENT_CHECKS", "3"))
+ACCOUNT_QUEUE_TIMEOUT = float(os.getenv("ACCOUNT_QUEUE_TIMEOUT", "30"))
+# Lock file backing the per-account slots; must be on a path all workers share
+ACCOUNT_SLOTS_PATH = os.getenv("ACCOUNT_SLOTS_PATH", "account_slots.bin")
+# Accounts with rejected logins are skipped for BASE * 2^(failures-1) seconds, up to MAX
+BREAKER_BASE_BACKOFF = int(os.getenv("BREAKER_BASE_BACKOFF", "60"))
+BREAKER_MAX_BACKOFF = int(os.getenv("BREAKER_MAX_BACKOFF", "21600"))
+
+SEED_IMPORT_MAX_ROWS = int(os.getenv("SEED_IMPORT_MAX_ROWS", "5000"))
+SEED_IMPORT_WORKERS = int(os.getenv("SEED_IMPORT_WORKERS", "16"))
+# Rows per multi-row INSERT (and per IN (...) lookup) during seed imports
+SEED_IMPORT_INSERT_BATCH = int(os.getenv("SEED_IMPORT_INSERT_BATCH", "500"))
+
+# "sqlite" shares jobs between gunicorn workers on one host; "local" keeps them in-process
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+JOB_QUEUE_SQLITE_PATH = os.getenv("JOB_QUEUE_SQLITE_PATH", "check_jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# A running job's lease is renewed while its worker lives; once it lapses the job is re-queued,
+# or failed after JOB_MAX_ATTEMPTS claims
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+JOB_STREAM_MAX_SECONDS = int(os.getenv("JOB_STREAM_MAX_SECONDS", "300"))
+
+MAILBOX_CACHE_ENABLED = os.getenv("MAILBOX_CACHE_ENABLED", "1") == "1"
+MAILBOX_CACHE_MAX_FOLDERS = int(os.getenv("MAILBOX_CACHE_MAX_FOLDERS", "2000"))
+MAILBOX_CACHE_SEARCHES_PER_FOLDER = int(os.getenv("MAILBOX_CACHE_SEARCHES_PER_FOLDER", "8"))
+
+IDLE_WATCH_ENABLED = os.getenv("IDLE_WATCH_ENABLED", "0") == "1"
+# Folder watchers across all workers; each also holds one of its account's check slots
+IDLE_MAX_WATCHERS = int(os.getenv("IDLE_MAX_WATCHERS", "40"))
+# Lock file backing the watcher cap; must be on a path all workers share
+IDLE_SLOTS_PATH = os.getenv("IDLE_SLOTS_PATH", "idle_slots.bin")
+# Re-issue IDLE well before Gmail's ~29 minute cutoff
+IDLE_ROTATE_SECONDS = int(os.getenv("IDLE_ROTATE_SECONDS", "600"))
+IDLE_CHECK_INTERVAL = int(os.getenv("IDLE_CHECK_INTERVAL", "5"))
+IDLE_MAX_FETCH = int(os.getenv("IDLE_MAX_FETCH", "10"))
+IDLE_SUBSCRIBER_QUEUE = int(os.getenv("IDLE_SUBSCRIBER_QUEUE", "100"))
+IDLE_STREAM_MAX_SECONDS = int(os.getenv("IDLE_STREAM_MAX_SECONDS", "1800"))
+
+# "threads" uses check_email_status on pooled IMAPClient sessions; "asyncio" uses aio_engine
+CHECK_ENGINE = os.getenv("CHECK_ENGINE", "threads")
+ASYNC_CHECK_CONCURRENCY = int(os.getenv("ASYNC_CHECK_CONCURRENCY", "200"))
+
+# /api/stats/history: "auto" buckets use hourly data up to this many days, daily beyond
+HISTORY_AUTO_HOURLY_DAYS = int(os.getenv("HISTORY_AUTO_HOURLY_DAYS", "14"))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "2000"))
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "60"))
+# Memory-mapped counter bumped on login/logout/user edits; must be on a path all workers share
+SESSION_VERSION_PATH = os.getenv("SESSION_VERSION_PATH", "session_version.bin")
+
+# Per-user cache of GET /api/emails and /api/users bodies, revalidated with ETags
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+# Memory-mapped counter bumped by every write that changes a cached listing; must be on a path all workers share
+RESPONSE_VERSION_PATH = os.getenv("RESPONSE_VERSION_PATH", "response_version.bin")
+
+# Fingerprinted files under frontend/build/static get the long lifetime; other top-level files the short one
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv("STATIC_IMMUTABLE_MAX_AGE", "31536000"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+# flask compress-static skips files smaller than this
+STATIC_COMPRESS_MIN_BYTES = int(os.getenv("STATIC_COMPRESS_MIN_BYTES", "1024"))
+
+# Rows fetched per round-trip from the server-side cursor behind /api/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+CAMPAIGN_SCHEDULER_ENABLED = os.getenv("CAMPAIGN_SCHEDULER_ENABLED", "1") == "1"
+CAMPAIGN_WORKERS = int(os.getenv("CAMPAIGN_WORKERS", "8"))
+CAMPAIGN_POLL_INTERVAL = int(os.getenv("CAMPAIGN_POLL_INTERVAL", "15"))
+CAMPAIGN_CLAIM_BATCH = int(os.getenv("CAMPAIGN_CLAIM_BATCH", "20"))
+CAMPAIGN_MIN_INTERVAL = int(os.getenv("CAMPAIGN_MIN_INTERVAL", "300"))
+CAMPAIGN_MAX_ACCOUNTS = int(os.getenv("CAMPAIGN_MAX_ACCOUNTS", "500"))
+# A run's account checks are spread over this fraction of the interval (capped), jittered per account
+CAMPAIGN_SPREAD_FRACTION = float(os.getenv("CAMPAIGN_SPREAD_FRACTION", "0.5"))
+CAMPAIGN_MAX_SPREAD = int(os.getenv("CAMPAIGN_MAX_SPREAD", "600"))
+CAMPAIGN_START_JITTER = int(os.getenv("CAMPAIGN_START_JITTER", "60"))
+# Buffered results are written when this many rows are waiting or this many seconds have passed
+CAMPAIGN_FLUSH_ROWS = int(os.getenv("CAMPAIGN_FLUSH_ROWS", "100"))
+CAMPAIGN_FLUSH_SECONDS = int(os.getenv("CAMPAIGN_FLUSH_SECONDS", "5"))
+CAMPAIGN_MAX_BUFFER = int(os.getenv("CAMPAIGN_MAX_BUFFER", "10000"))
+
+# Rows per multi-row upsert into message_observations
+OBSERVATION_UPSERT_BATCH = int(os.getenv("OBSERVATION_UPSERT_BATCH", "200"))
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Per-worker snapshots are written here and merged by /metrics; must be on a path all workers share
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics_data")
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+# Optional bearer token required by /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Log requests slower than this (ms) with their phase breakdown; 0 turns the slow log off
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "0"))
@@ -0,0 +1,258 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g
+
+import config
+import metrics
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class TimedCursor(MySQLdb.cursors.Cursor):
+    """Default cursor that records each statement in ``db_query_seconds``."""
+
+    _in_many = False
+
+    def execute(self, query, args=None):
+        if self._in_many:
+            return super().execute(query, args)
+        with metrics.query_timer(query):
+            return super().execute(query, args)
+
+    def executemany(self, query, args):
+        # Non-INSERT executemany falls back to execute() per row; time it once, as a whole
+        self._in_many = True
+        try:
+            with metrics.query_timer(query):
+                return super().executemany(query, args)
+        finally:
+            self._in_many = False
+
+
+class _Pooled:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Fixed-size pool of MySQLdb connections for one worker process.
+
+    Connections are opened lazily up to ``size``. On checkout a connection older
+    than ``recycle`` seconds is replaced, and one idle for longer than
+    ``ping_interval`` is pinged first so a server-side timeout never reaches a
+    handler. Wait time and utilisation are tracked for ``stats()``.
+    """
+
+    def __init__(self, connect_kwargs, size=None, timeout=None, recycle=None, ping_interval=None):
+        self.connect_kwargs = connect_kwargs
+        self.size = size or config.MYSQL_POOL_SIZE
+        self.timeout = timeout if timeout is not None else config.MYSQL_POOL_TIMEOUT
+        self.recycle = recycle if recycle is not None else config.MYSQL_POOL_RECYCLE
+        self.ping_interval = ping_interval if ping_interval is not None else config.MYSQL_POOL_PING_INTERVAL
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+
+    def _open(self):
+        return _Pooled(MySQLdb.connect(**self.connect_kwargs))
+
+    def _discard(self, pooled):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def _reserve_new(self):
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return True
+        return False
+
+    def _usable(self, pooled):
+        now = time.monotonic()
+        if now - pooled.created_at > self.recycle:
+            return False
+        if now - pooled.last_used > self.ping_interval:
+            try:
+                pooled.conn.ping()
+            except Exception:
+                return False
+        return True
+
+    def checkout(self):
+        started = time.monotonic()
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = None
+                if self._reserve_new():
+                    try:
+                        pooled = self._open()
+                    except Exception:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                else:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        with self._lock:
+                            self._timeouts += 1
+                        raise PoolTimeout(f"No MySQL connection available within {self.timeout}s")
+                    try:
+                        # Short waits so capacity freed by a discarded connection is noticed too
+                        pooled = self._idle.get(timeout=min(remaining, 0.05))
+                    except queue.Empty:
+                        continue
+            if pooled is not None and not self._usable(pooled):
+                with self._lock:
+                    self._recycled += 1
+                self._discard(pooled)
+                continue
+            break
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return pooled
+
+    def checkin(self, pooled, broken=False):
+        with self._lock:
+            self._in_use -= 1
+        if not broken:
+            try:
+                # Never hand the next request an open transaction
+                pooled.conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        self._idle.put(pooled)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "utilization": round(self._in_use / self.size, 3) if self.size else 0,
+                "checkouts": self._checkouts,
+                "wait_avg_ms": round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+            }
+
+
+class PooledMySQL:
+    """Drop-in for ``flask_mysqldb.MySQL``: ``mysql.connection`` now borrows from a pool.
+
+    The connection is checked out on first use in an app context and returned on
+    teardown, so existing ``mysql.connection.cursor()`` / ``commit()`` call sites
+    keep working unchanged.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        connect_kwargs = {
+            "host": app.config.get("MYSQL_HOST", "localhost"),
+            "user": app.config.get("MYSQL_USER", "root"),
+            "passwd": app.config.get("MYSQL_PASSWORD", ""),
+            "db": app.config.get("MYSQL_DB", ""),
+            "port": int(app.config.get("MYSQL_PORT", 3306)),
+            "charset": app.config.get("MYSQL_CHARSET", "utf8"),
+            "connect_timeout": int(app.config.get("MYSQL_CONNECT_TIMEOUT", 10)),
+        }
+        if config.METRICS_ENABLED:
+            connect_kwargs["cursorclass"] = TimedCursor
+        self.pool = ConnectionPool(connect_kwargs)
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        pooled = g.get("_mysql_pooled")
+        if pooled is None:
+            pooled = g._mysql_pooled = self.pool.checkout()
+        return pooled.conn
+
+    def release(self):
+        """Return this app context's connection now; the next ``connection`` access checks out a fresh one.
+
+        For handlers that do slow non-DB work (IMAP checks) between their reads and writes,
+        so the connection isn't held idle for the duration. Uncommitted work is rolled back.
+        """
+        pooled = g.pop("_mysql_pooled", None)
+        if pooled is not None:
+            self.pool.checkin(pooled)
+
+    def teardown(self, exception):
+        pooled = g.pop("_mysql_pooled", None)
+        if pooled is not None:
+            self.pool.checkin(pooled, broken=isinstance(exception, MySQLdb.OperationalError))
+
+    @contextmanager
+    def borrow(self):
+        """Check out a connection for code running outside an app context (background threads)."""
+        pooled = self.pool.checkout()
+        broken = False
+        try:
+            yield pooled.conn
+        except MySQLdb.OperationalError:
+            broken = True
+            raise
+        finally:
+            self.pool.checkin(pooled, broken=broken)
+
+    def stream(self, sql, params=(), batch_size=None):
+        """Yield ``(columns, rows)`` batches from an unbuffered server-side cursor.
+
+        Uses its own pooled connection so the stream can outlive the request's app
+        context. If the consumer stops early the connection is closed rather than
+        drained, since draining a large result would read every remaining row.
+        """
+        batch_size = batch_size or config.EXPORT_BATCH_SIZE
+        pooled = self.pool.checkout()
+        finished = False
+        try:
+            cur = pooled.conn.cursor(MySQLdb.cursors.SSCursor)
+            cur.execute(sql, params)
+            columns = [desc[0] for desc in cur.description]
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield columns, rows
+            cur.close()
+            finished = True
+        finally:
+            self.pool.checkin(pooled, broken=not finished)
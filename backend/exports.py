@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def encode(batches, fmt):
+    """Turn ``(columns, rows)`` batches into NDJSON or CSV chunks, one chunk per batch."""
+    header_sent = False
+    for columns, rows in batches:
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            if not header_sent:
+                writer.writerow(columns)
+                header_sent = True
+            writer.writerows([[_value(v) for v in row] for row in rows])
+            yield buf.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(columns, map(_value, row)))) + "\n" for row in rows)
+
+
+def keyset_args(args, default_limit=None, max_limit=500):
+    """Read ``after`` / ``limit`` query args. ``limit`` is None when the caller did not ask to page."""
+    after = args.get("after", default=0, type=int)
+    limit = args.get("limit", default=default_limit, type=int)
+    if limit is not None:
+        limit = max(1, min(limit, max_limit))
+    return after, limit
+
+
+def next_cursor(rows, limit, id_index=0):
+    """Cursor for the following page, or None when this page was the last one."""
+    if limit is None or len(rows) < limit:
+        return None
+    return rows[-1][id_index]
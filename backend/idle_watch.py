@@ -0,0 +1,218 @@
+import queue
+import threading
+import time
+
+from imapclient import IMAPClient
+
+import account_guard
+import check_results
+import config
+import imap_fetch
+
+FOLDERS = {"INBOX": "inbox", "[Gmail]/Spam": "spam"}
+
+
+class WatchLimitError(Exception):
+    pass
+
+
+class Subscription:
+    """One SSE client's view of the watchers: a search filter plus an event queue."""
+
+    def __init__(self, accounts, search_text):
+        self.accounts = accounts
+        self.search_text = (search_text or '').lower()
+        self.events = queue.Queue(maxsize=config.IDLE_SUBSCRIBER_QUEUE)
+
+    def matches(self, event):
+        if not self.search_text:
+            return True
+        sender = f"{event['sender_name']} <{event['sender_email']}>".lower()
+        return self.search_text in sender
+
+    def publish(self, event):
+        if event['email'] in self.accounts and self.matches(event):
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+class FolderWatcher(threading.Thread):
+    """Holds one IDLE connection on one folder and reports new arrivals to subscribers.
+
+    IDLE is re-issued every ``IDLE_ROTATE_SECONDS`` so the server never reaches its
+    own inactivity timeout (29 minutes per RFC 2177). Dropped connections are
+    re-established with exponential backoff, and any UIDs that arrived while
+    disconnected are picked up from the watermark. ``slots`` are ``(governor, token)``
+    pairs taken for this watcher; they are released when the thread exits, so they
+    stay held for as long as its connection can be open.
+    """
+
+    def __init__(self, account, password, folder, slots=()):
+        super().__init__(name=f"idle-{account}-{folder}", daemon=True)
+        self.account = account
+        self.password = password
+        self.folder = folder
+        self.slots = list(slots)
+        self.subscribers = set()
+        self.uidvalidity = None
+        self.uidnext = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            self._run()
+        finally:
+            for governor, token in self.slots:
+                governor.release(token)
+
+    def _run(self):
+        backoff = 1
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self._watch()
+            except Exception as e:
+                print(f"IDLE watcher error on {self.account} {self.folder} : {e}")
+            if time.monotonic() - started > 60:
+                backoff = 1
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _watch(self):
+        client = IMAPClient(config.IMAP_HOST, port=config.IMAP_PORT, ssl=config.IMAP_SSL, timeout=config.IMAP_TIMEOUT)
+        try:
+            client.login(self.account, self.password)
+            info = client.select_folder(self.folder, readonly=True)
+            if info.get(b'UIDVALIDITY') != self.uidvalidity or self.uidnext is None:
+                self.uidvalidity = info.get(b'UIDVALIDITY')
+                self.uidnext = info.get(b'UIDNEXT') or 1
+            else:
+                self._collect(client)
+
+            while not self._stop_event.is_set():
+                client.idle()
+                deadline = time.monotonic() + config.IDLE_ROTATE_SECONDS
+                arrived = False
+                while not self._stop_event.is_set() and time.monotonic() < deadline:
+                    responses = client.idle_check(timeout=config.IDLE_CHECK_INTERVAL)
+                    if any(len(r) > 1 and r[1] == b'EXISTS' for r in responses):
+                        arrived = True
+                        break
+                client.idle_done()
+                if arrived:
+                    self._collect(client)
+        finally:
+            try:
+                client.logout()
+            except Exception:
+                pass
+
+    def _collect(self, client):
+        uids = [u for u in client.search(['UID', f'{self.uidnext}:*']) if u >= self.uidnext]
+        if not uids:
+            return
+        self.uidnext = max(uids) + 1
+        previews = imap_fetch.fetch_previews(client, uids[-config.IDLE_MAX_FETCH:])
+        for uid, data in sorted(previews.items()):
+            self._publish(self._event(uid, data))
+
+    def _event(self, uid, data):
+        # Same parsing and truncation as a check result, so the two can't drift apart
+        email = check_results.preview_email(uid, self.folder, data)
+        return {
+            "email": self.account,
+            "type": FOLDERS.get(self.folder, self.folder),
+            "uid": uid,
+            "date": email['date'],
+            "subject": email['subject'],
+            "sender_email": email['sender'],
+            "sender_name": email['sender_name'],
+            "text": check_results.safe_text(email['text_body']),
+        }
+
+    def _publish(self, event):
+        for subscription in list(self.subscribers):
+            subscription.publish(event)
+
+
+class WatchRegistry:
+    """Shares one FolderWatcher per (account, folder) between all subscriptions in this process.
+
+    Every watcher holds a slot in ``watch_slots``, a single-bucket AccountGovernor
+    shared by all workers, so ``max_watchers`` caps IDLE connections host-wide. It
+    also holds one of its account's check slots in ``account_slots`` (the checks'
+    governor), so watchers and checks together stay within the per-account limit.
+    """
+
+    def __init__(self, max_watchers=None, watch_slots=None, account_slots=None):
+        self.max_watchers = max_watchers or config.IDLE_MAX_WATCHERS
+        self.watch_slots = watch_slots or account_guard.AccountGovernor(
+            config.IDLE_SLOTS_PATH, max_per_account=self.max_watchers, buckets=1)
+        self.account_slots = account_slots or account_guard.get_guard().governor
+        self._watchers = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, keys):
+        """Take a watcher slot and an account slot per key, all or nothing."""
+        reserved = []
+        try:
+            for account, _ in keys:
+                slots = []
+                reserved.append(slots)
+                token = self.watch_slots.try_acquire("idle")
+                if token is None:
+                    raise WatchLimitError(f"At most {self.max_watchers} folder watchers may run at once")
+                slots.append((self.watch_slots, token))
+                token = self.account_slots.try_acquire(account)
+                if token is None:
+                    raise WatchLimitError(f"{account} is busy with other checks, try again shortly")
+                slots.append((self.account_slots, token))
+        except WatchLimitError:
+            for slots in reserved:
+                for governor, token in slots:
+                    governor.release(token)
+            raise
+        return reserved
+
+    def subscribe(self, accounts, search_text):
+        """``accounts`` maps email -> app password. Raises WatchLimitError past either cap."""
+        subscription = Subscription(set(accounts), search_text)
+        with self._lock:
+            keys = [(account, folder) for account in accounts for folder in FOLDERS]
+            new_keys = [key for key in keys if key not in self._watchers]
+            for (account, folder), slots in zip(new_keys, self._reserve(new_keys)):
+                watcher = self._watchers[(account, folder)] = FolderWatcher(account, accounts[account], folder, slots)
+                watcher.start()
+            for key in keys:
+                self._watchers[key].subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for key, watcher in list(self._watchers.items()):
+                watcher.subscribers.discard(subscription)
+                if not watcher.subscribers:
+                    watcher.stop()
+                    del self._watchers[key]
+
+    def active(self):
+        with self._lock:
+            return len(self._watchers)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = WatchRegistry()
+    return _registry
@@ -0,0 +1,137 @@
+import base64
+import quopri
+
+import config
+import metrics
+
+HEADER_ITEMS = ['ENVELOPE', 'X-GM-LABELS', 'X-GM-MSGID', 'BODYSTRUCTURE']
+
+
+def _lower(value):
+    if isinstance(value, bytes):
+        return value.decode('ascii', 'replace').lower()
+    return (value or '').lower()
+
+
+def _charset(params):
+    # params is a flat (name, value, name, value, ...) tuple, or None
+    if not params:
+        return 'utf-8'
+    items = list(params)
+    for i in range(0, len(items) - 1, 2):
+        if _lower(items[i]) == 'charset':
+            return _lower(items[i + 1]) or 'utf-8'
+    return 'utf-8'
+
+
+def _walk(body, section=''):
+    """Yield (section, content_type, charset, encoding) for each leaf part of a BODYSTRUCTURE."""
+    if body.is_multipart:
+        for i, part in enumerate(body[0], 1):
+            yield from _walk(part, f"{section}.{i}" if section else str(i))
+        return
+    content_type = f"{_lower(body[0])}/{_lower(body[1])}"
+    yield section or '1', content_type, _charset(body[2]), _lower(body[5])
+
+
+def first_text_part(bodystructure):
+    """Return (section, content_type, charset, encoding) of the best preview part.
+
+    The first text/plain part wins; otherwise the first text/html part; otherwise None.
+    """
+    if bodystructure is None:
+        return None
+    html = None
+    for part in _walk(bodystructure):
+        if part[1] == 'text/plain':
+            return part
+        if part[1] == 'text/html' and html is None:
+            html = part
+    return html
+
+
+def decode_partial(data, charset, encoding):
+    """Decode a possibly truncated body fragment into text."""
+    if not data:
+        return ''
+    if encoding == 'base64':
+        compact = b''.join(data.split())
+        compact = compact[:len(compact) - len(compact) % 4]
+        try:
+            data = base64.b64decode(compact)
+        except ValueError:
+            return ''
+    elif encoding == 'quoted-printable':
+        # Drop a dangling soft break / escape cut off by the byte range
+        cut = data.rfind(b'=', max(0, len(data) - 2))
+        if cut != -1:
+            data = data[:cut]
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset, errors='replace')
+    except LookupError:
+        return data.decode('utf-8', errors='replace')
+
+
+def _body_section(data):
+    for key, value in data.items():
+        if key.startswith(b'BODY['):
+            return value
+    return None
+
+
+def plan_previews(headers):
+    """Turn a header FETCH response into preview entries plus the body sections to fetch.
+
+    Returns ``(results, by_section)`` where ``by_section`` maps a section number to
+    the ``(uid, part)`` pairs whose preview lives in that section.
+    """
+    results = {}
+    by_section = {}
+    for uid, data in headers.items():
+        part = first_text_part(data.get(b'BODYSTRUCTURE'))
+        results[uid] = {
+            "envelope": data[b'ENVELOPE'],
+            "labels": [l.decode() for l in data.get(b'X-GM-LABELS', [])],
+            "gm_msgid": data.get(b'X-GM-MSGID'),
+            "content_type": part[1] if part else None,
+            "raw_body": None,
+        }
+        if part:
+            by_section.setdefault(part[0], []).append((uid, part))
+    return results, by_section
+
+
+def section_items(section, max_bytes):
+    return [f'BODY.PEEK[{section}]<0.{max_bytes}>']
+
+
+def apply_bodies(results, members, bodies):
+    for uid, (_, content_type, charset, encoding) in members:
+        data = bodies.get(uid)
+        if data is None:
+            continue
+        results[uid]["raw_body"] = decode_partial(_body_section(data), charset, encoding)
+
+
+def fetch_previews(client, uids, max_bytes=None):
+    """Fetch envelope, labels and a bounded preview for ``uids`` in two pipelined commands.
+
+    The first FETCH returns ENVELOPE, X-GM-LABELS and BODYSTRUCTURE for every UID.
+    The second pulls only ``max_bytes`` of the chosen text part, grouping UIDs that
+    share a section so the common case is a single command.
+
+    Returns ``{uid: {"envelope", "labels", "gm_msgid", "content_type", "raw_body"}}`` where
+    ``raw_body`` is the decoded (possibly truncated) text of the preview part.
+    """
+    if not uids:
+        return {}
+    max_bytes = max_bytes or config.IMAP_PREVIEW_BYTES
+    with metrics.phase("fetch_headers"):
+        headers = client.fetch(uids, HEADER_ITEMS)
+    results, by_section = plan_previews(headers)
+    for section, members in by_section.items():
+        with metrics.phase("fetch_body"):
+            bodies = client.fetch([uid for uid, _ in members], section_items(section, max_bytes))
+        apply_bodies(results, members, bodies)
+    return results
@@ -0,0 +1,164 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from imapclient import IMAPClient
+
+import config
+import metrics
+
+
+class SessionTimeout(Exception):
+    pass
+
+
+class _Session:
+    def __init__(self, client, password):
+        self.client = client
+        self.password = password
+        self.last_used = time.monotonic()
+
+
+class IMAPSessionPool:
+    """Keeps authenticated IMAP sessions per account so repeat checks skip TLS + LOGIN."""
+
+    def __init__(self, host=None, port=None, max_per_account=None, idle_timeout=None, timeout=None,
+                 checkout_timeout=None):
+        self.host = host or config.IMAP_HOST
+        self.port = port or config.IMAP_PORT
+        self.max_per_account = max_per_account or config.IMAP_POOL_MAX_PER_ACCOUNT
+        self.idle_timeout = idle_timeout if idle_timeout is not None else config.IMAP_POOL_IDLE_TIMEOUT
+        self.timeout = timeout if timeout is not None else config.IMAP_TIMEOUT
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else config.IMAP_POOL_CHECKOUT_TIMEOUT
+        self._lock = threading.Lock()
+        self._idle = {}        # account -> [_Session]
+        self._in_use = {}      # account -> int
+        self._conds = {}       # account -> threading.Condition
+
+    def _connect(self, account, password):
+        with metrics.phase("imap_connect"):
+            client = IMAPClient(self.host, port=self.port, ssl=config.IMAP_SSL, timeout=self.timeout)
+        try:
+            with metrics.phase("imap_login"):
+                client.login(account, password)
+        except Exception:
+            self._close(client)
+            raise
+        return _Session(client, password)
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.logout()
+        except Exception:
+            try:
+                client.shutdown()
+            except Exception:
+                pass
+
+    def _healthy(self, session, password):
+        if session.password != password:
+            return False
+        if time.monotonic() - session.last_used > self.idle_timeout:
+            return False
+        try:
+            session.client.noop()
+        except Exception:
+            return False
+        return True
+
+    def _checkout(self, account):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._lock:
+            cond = self._conds.setdefault(account, threading.Condition(self._lock))
+            while self._in_use.get(account, 0) >= self.max_per_account:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SessionTimeout(f"No IMAP session for {account} within {self.checkout_timeout}s")
+                cond.wait(remaining)
+            self._in_use[account] = self._in_use.get(account, 0) + 1
+            idle = self._idle.get(account, [])
+            return idle.pop() if idle else None
+
+    def _checkin(self, account, session):
+        with self._lock:
+            self._in_use[account] -= 1
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._idle.setdefault(account, []).append(session)
+            self._conds[account].notify()
+
+    @contextmanager
+    def session(self, account, password):
+        """Yield a logged-in IMAPClient for ``account``.
+
+        Stale, logged-out or idle-expired sessions are replaced transparently.
+        A session that raises inside the block is dropped instead of being reused.
+        """
+        session = self._checkout(account)
+        ok = False
+        try:
+            if session is not None and not self._healthy(session, password):
+                self._close(session.client)
+                session = None
+            if session is None:
+                session = self._connect(account, password)
+            yield session.client
+            ok = True
+        finally:
+            if not ok and session is not None:
+                self._close(session.client)
+            self._checkin(account, session if ok else None)
+
+    def evict_idle(self):
+        """Log out sessions that have sat idle longer than ``idle_timeout``."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for account, sessions in self._idle.items():
+                keep = []
+                for s in sessions:
+                    (expired if now - s.last_used > self.idle_timeout else keep).append(s)
+                self._idle[account] = keep
+        for s in expired:
+            self._close(s.client)
+        return len(expired)
+
+    def discard(self, account):
+        """Drop every idle session for ``account`` (e.g. after its password changed)."""
+        with self._lock:
+            sessions = self._idle.pop(account, [])
+        for s in sessions:
+            self._close(s.client)
+
+    def close_all(self):
+        with self._lock:
+            sessions = [s for group in self._idle.values() for s in group]
+            self._idle.clear()
+        for s in sessions:
+            self._close(s.client)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = IMAPSessionPool()
+                _start_reaper(_pool)
+    return _pool
+
+
+def _start_reaper(pool):
+    interval = max(1, pool.idle_timeout // 2)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            pool.evict_idle()
+
+    threading.Thread(target=run, name="imap-pool-reaper", daemon=True).start()
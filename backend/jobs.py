@@ -0,0 +1,296 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+import config
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value):
+    return json.dumps(value, default=_json_default)
+
+
+class LocalJobQueue:
+    """In-process job queue. Jobs are only visible to the worker process that accepted them."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, payload, owner_id=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {"id": job_id, "kind": kind, "owner_id": owner_id, "status": QUEUED,
+                                  "payload": payload, "result": None, "error": None,
+                                  "created_at": now, "updated_at": now}
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, timeout=1.0):
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self._update(job_id, status=RUNNING)
+
+    def complete(self, job_id, result):
+        # Round-trip through JSON so callers see the same shapes as with the SQLite backend
+        self._update(job_id, status=DONE, result=json.loads(dumps(result)))
+
+    def fail(self, job_id, error):
+        self._update(job_id, status=FAILED, error=str(error))
+
+    def heartbeat(self, job_ids):
+        # Jobs die with this process, so there is no lease to renew
+        pass
+
+    def purge(self, older_than):
+        cutoff = time.time() - older_than
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job["status"] in FINISHED and job["updated_at"] < cutoff]:
+                del self._jobs[job_id]
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields, updated_at=time.time())
+            return dict(job)
+
+
+class SQLiteJobQueue:
+    """Job queue stored in a SQLite file, shared by every gunicorn worker on the host.
+
+    A claimed job holds a lease (``locked_until``) that its worker renews with
+    ``heartbeat``. If the worker process dies, the lease lapses and ``claim`` hands
+    the job to another worker, up to JOB_MAX_ATTEMPTS claims in total, then fails it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS check_jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, owner_id INTEGER, status TEXT NOT NULL,
+                payload TEXT NOT NULL, result TEXT, error TEXT,
+                created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_check_jobs_status ON check_jobs (status, created_at)")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(check_jobs)")}
+            if "locked_until" not in columns:
+                conn.execute("ALTER TABLE check_jobs ADD COLUMN locked_until REAL")
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE check_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def submit(self, kind, payload, owner_id=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO check_jobs (id, kind, owner_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, owner_id, QUEUED, dumps(payload), now, now))
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM check_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        conn = self._conn()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._fail_abandoned(conn, now)
+                # Queued jobs, or running ones whose worker stopped renewing the lease
+                row = conn.execute("""SELECT id FROM check_jobs WHERE status = ?
+                                      OR (status = ? AND (locked_until IS NULL OR locked_until < ?))
+                                      ORDER BY created_at LIMIT 1""", (QUEUED, RUNNING, now)).fetchone()
+                if row is not None:
+                    conn.execute("""UPDATE check_jobs SET status = ?, updated_at = ?, locked_until = ?,
+                                    attempts = attempts + 1 WHERE id = ?""",
+                                 (RUNNING, now, now + config.JOB_LEASE_SECONDS, row["id"]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if row is not None:
+                return self.get(row["id"])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(min(0.2, max(0.0, deadline - time.monotonic())))
+
+    def complete(self, job_id, result):
+        self._conn().execute("UPDATE check_jobs SET status = ?, result = ?, updated_at = ?, locked_until = NULL WHERE id = ?",
+                             (DONE, dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        self._conn().execute("UPDATE check_jobs SET status = ?, error = ?, updated_at = ?, locked_until = NULL WHERE id = ?",
+                             (FAILED, str(error), time.time(), job_id))
+
+    def heartbeat(self, job_ids):
+        """Extend the lease of jobs this process is still running."""
+        if job_ids:
+            placeholders = ",".join("?" * len(job_ids))
+            self._conn().execute(f"UPDATE check_jobs SET locked_until = ? WHERE status = ? AND id IN ({placeholders})",
+                                 (time.time() + config.JOB_LEASE_SECONDS, RUNNING, *job_ids))
+
+    def _fail_abandoned(self, conn, now):
+        # Lease lapsed on the last allowed attempt: its workers keep dying on it, so stop retrying
+        conn.execute("""UPDATE check_jobs SET status = ?, error = ?, updated_at = ?, locked_until = NULL
+                        WHERE status = ? AND (locked_until IS NULL OR locked_until < ?) AND attempts >= ?""",
+                     (FAILED, f"Worker stopped responding ({config.JOB_MAX_ATTEMPTS} attempts)", now,
+                      RUNNING, now, config.JOB_MAX_ATTEMPTS))
+
+    def purge(self, older_than):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._fail_abandoned(conn, now)
+            conn.execute("DELETE FROM check_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                         (DONE, FAILED, now - older_than))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class JobWorkers:
+    """Background threads that pull jobs off a queue and dispatch them by ``kind``."""
+
+    def __init__(self, job_queue, handlers, size):
+        self.queue = job_queue
+        self.handlers = handlers
+        self.size = size
+        self._threads = []
+        self._stop = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._run, name=f"check-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="check-job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _heartbeat(self):
+        # Renew well inside the lease so a busy SQLite file can't make a live job look abandoned
+        while not self._stop.wait(config.JOB_LEASE_SECONDS / 3):
+            with self._running_lock:
+                job_ids = list(self._running)
+            try:
+                self.queue.heartbeat(job_ids)
+            except Exception as e:
+                print(f"Job heartbeat failed : {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        last_purge = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(timeout=1.0)
+            except Exception as e:
+                print(f"Job queue error : {e}")
+                time.sleep(1)
+                continue
+            if time.monotonic() - last_purge > 60:
+                last_purge = time.monotonic()
+                self.queue.purge(config.JOB_RESULT_TTL)
+            if job is None:
+                continue
+            with self._running_lock:
+                self._running.add(job["id"])
+            try:
+                result = self.handlers[job["kind"]](job["payload"])
+                self.queue.complete(job["id"], result)
+            except Exception as e:
+                print(f"Job {job['id']} failed : {e}")
+                self.queue.fail(job["id"], e)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["id"])
+
+
+def public_view(job):
+    return {"id": job["id"], "status": job["status"], "result": job["result"], "error": job["error"],
+            "created_at": job["created_at"], "updated_at": job["updated_at"]}
+
+
+def wait_for_update(job_queue, job_id, since, timeout):
+    """Poll until the job's ``updated_at`` moves past ``since`` or ``timeout`` elapses."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = job_queue.get(job_id)
+        if job is None or job["updated_at"] > since or time.monotonic() >= deadline:
+            return job
+        time.sleep(config.JOB_POLL_INTERVAL)
+
+
+_queue = None
+_workers = None
+_init_lock = threading.RLock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _init_lock:
+            if _queue is None:
+                if config.JOB_QUEUE_BACKEND == "sqlite":
+                    _queue = SQLiteJobQueue(config.JOB_QUEUE_SQLITE_PATH)
+                else:
+                    _queue = LocalJobQueue()
+    return _queue
+
+
+def start_workers(handlers):
+    """Start this process's worker pool once; safe to call from every request."""
+    global _workers
+    if _workers is None:
+        with _init_lock:
+            if _workers is None:
+                _workers = JobWorkers(get_queue(), handlers, config.JOB_WORKERS)
+                _workers.start()
+    return _workers
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+import config
+import metrics
+
+
+class FolderCache:
+    """Cached state for one (account, folder): UIDVALIDITY, watermarks and parsed messages.
+
+    Each remembered search keeps its matching UIDs together with the UIDNEXT
+    (the watermark: every UID below it has been seen) and EXISTS values of the
+    sync that produced them. An unchanged folder is answered without a SEARCH;
+    after pure appends only UIDs above the watermark are searched.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.uidvalidity = None
+        self.messages = {}  # uid -> parsed email dict
+        self.searches = OrderedDict()  # search text -> (sorted matching uids, uidnext, exists)
+
+    def reset(self, uidvalidity):
+        self.uidvalidity = uidvalidity
+        self.messages.clear()
+        self.searches.clear()
+
+    def matching_uids(self, client, select_info, search_text, criteria):
+        """Return all UIDs matching ``criteria``, searching only above the watermark when possible."""
+        uidvalidity = select_info.get(b'UIDVALIDITY')
+        uidnext = select_info.get(b'UIDNEXT')
+        exists = select_info.get(b'EXISTS')
+        if uidvalidity != self.uidvalidity:
+            self.reset(uidvalidity)
+
+        state = self.searches.get(search_text)
+        if state is not None and uidnext is not None and state[1] is not None:
+            cached, seen_next, seen_exists = state
+            if uidnext == seen_next and exists == seen_exists:
+                # Nothing arrived and nothing was expunged since the last sync
+                self.searches.move_to_end(search_text)
+                return cached
+            new_uids = [u for u in client.search(['UID', f'{seen_next}:*']) if u >= seen_next]
+            if seen_exists + len(new_uids) == exists:
+                # Only appends happened: match the new UIDs and keep the cached ones. A UID that arrived
+                # between the last SELECT and its SEARCH is already cached, so merge rather than append
+                matched = [u for u in client.search(['UID', f'{seen_next}:*'] + criteria) if u >= seen_next]
+                return self._remember(search_text, sorted(set(cached).union(matched)), uidnext, exists)
+
+        return self._remember(search_text, sorted(client.search(criteria)), uidnext, exists)
+
+    def _remember(self, search_text, uids, uidnext, exists):
+        self.searches[search_text] = (uids, uidnext, exists)
+        self.searches.move_to_end(search_text)
+        return uids
+
+    def store(self, emails):
+        for email in emails:
+            self.messages[email['uid']] = email
+
+    def trim(self, keep_per_search):
+        """Drop searches beyond the configured count and messages no longer referenced."""
+        while len(self.searches) > config.MAILBOX_CACHE_SEARCHES_PER_FOLDER:
+            self.searches.pop(next(iter(self.searches)))
+        wanted = set()
+        for uids, _, _ in self.searches.values():
+            wanted.update(uids[-keep_per_search:])
+        for uid in [u for u in self.messages if u not in wanted]:
+            del self.messages[uid]
+
+
+class MailboxCache:
+    """LRU of FolderCache entries keyed by (account, folder)."""
+
+    def __init__(self, max_folders=None):
+        self.max_folders = max_folders or config.MAILBOX_CACHE_MAX_FOLDERS
+        self._folders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def folder(self, account, folder):
+        key = (account, folder)
+        with self._lock:
+            entry = self._folders.get(key)
+            if entry is None:
+                entry = self._folders[key] = FolderCache()
+            self._folders.move_to_end(key)
+            while len(self._folders) > self.max_folders:
+                self._folders.popitem(last=False)
+            return entry
+
+    def invalidate(self, account):
+        with self._lock:
+            for key in [k for k in self._folders if k[0] == account]:
+                del self._folders[key]
+
+
+_cache = MailboxCache()
+
+
+def get_cache():
+    return _cache
+
+
+def sync_folder(client, account, folder, search_text, criteria, limit, fetch):
+    """Return the newest ``limit`` parsed emails in ``folder`` matching ``criteria``.
+
+    Only UIDs missing from the cache are passed to ``fetch(client, folder, uids)``,
+    which must return parsed email dicts carrying a ``uid`` key.
+    """
+    with metrics.phase("select_folder"):
+        select_info = client.select_folder(folder)
+    entry = _cache.folder(account, folder)
+    with entry.lock:
+        with metrics.phase("search"):
+            uids = entry.matching_uids(client, select_info, search_text or '', criteria)[-limit:]
+        missing = [u for u in uids if u not in entry.messages]
+        if missing:
+            entry.store(fetch(client, folder, missing))
+        emails = [entry.messages[u] for u in uids if u in entry.messages]
+        entry.trim(limit)
+        return emails
@@ -0,0 +1,372 @@
+"""Phase timings, route latency and DB query histograms in Prometheus text format.
+
+Each worker process keeps its own counters and histograms and writes a snapshot
+to ``METRICS_DIR/<pid>.json`` every few seconds. ``/metrics`` merges the snapshots
+of all workers on the host, so a scrape gives the same totals whichever worker
+answers it. Counters and histograms from workers that have exited are kept,
+because Prometheus expects them never to go down: a scrape folds an exited
+worker's file into ``archive.json`` and deletes it. Snapshot files are named by
+pid and process start time, so a worker that reuses a pid can't overwrite its
+predecessor's totals. Gauges only count from live workers.
+
+With ``METRICS_ENABLED=0``, ``phase()`` returns a shared no-op context manager
+and nothing else runs.
+"""
+import contextvars
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import config
+
+PREFIX = "flask_email_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "phase_seconds": ("histogram", "Time spent in one phase of a check (IMAP, MIME parsing, MySQL)."),
+    "request_seconds": ("histogram", "HTTP request latency by route."),
+    "db_query_seconds": ("histogram", "MySQL statement latency by statement type."),
+    "check_failures_total": ("counter", "Account checks that failed, by reason."),
+    "db_pool_in_use": ("gauge", "MySQL connections currently checked out."),
+    "db_pool_opened": ("gauge", "MySQL connections currently open."),
+}
+
+_NOOP = nullcontext()
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+_verb = re.compile(r'\s*(\w+)')
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}   # name -> {label key -> [bucket counts..., +Inf count, sum]}
+        self.counters = {}     # name -> {label key -> value}
+        self.gauges = {}       # name -> callable returning value
+
+    def observe(self, name, labels, seconds):
+        key = _key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            else:
+                values[len(BUCKETS)] += 1
+            values[-1] += seconds
+
+    def inc(self, name, labels, value=1):
+        key = _key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            data = {
+                "histograms": {n: [[list(k), list(v)] for k, v in s.items()] for n, s in self.histograms.items()},
+                "counters": {n: [[list(k), v] for k, v in s.items()] for n, s in self.counters.items()},
+            }
+        gauges = {}
+        for name, fn in self.gauges.items():
+            try:
+                gauges[name] = fn()
+            except Exception:
+                pass
+        data["gauges"] = gauges
+        return data
+
+
+_registry = Registry()
+
+
+def observe(name, labels, seconds):
+    if config.METRICS_ENABLED:
+        _registry.observe(name, labels, seconds)
+
+
+def inc(name, labels, value=1):
+    if config.METRICS_ENABLED:
+        _registry.inc(name, labels, value)
+
+
+def gauge(name, fn):
+    _registry.gauges[name] = fn
+
+
+@contextmanager
+def _timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _registry.observe("phase_seconds", {"phase": name}, elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def phase(name):
+    """Time a block as ``phase_seconds{phase=name}`` and add it to the current request's trace."""
+    if not config.METRICS_ENABLED:
+        return _NOOP
+    return _timed(name)
+
+
+def query_timer(sql):
+    if not config.METRICS_ENABLED:
+        return _NOOP
+    match = _verb.match(sql if isinstance(sql, str) else sql.decode('utf-8', 'replace'))
+    return _timed_query(match.group(1).lower() if match else "other")
+
+
+@contextmanager
+def _timed_query(op):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _registry.observe("db_query_seconds", {"op": op}, elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append(("mysql", elapsed))
+
+
+def start_trace():
+    """Begin collecting phases for the current request; returns a token for ``finish_trace``."""
+    return _trace.set([]), time.perf_counter()
+
+
+def finish_trace(token, route, method, status):
+    reset_token, started = token
+    elapsed = time.perf_counter() - started
+    trace = _trace.get()
+    _trace.reset(reset_token)
+    _registry.observe("request_seconds", {"route": route, "method": method, "status": str(status)}, elapsed)
+    if config.SLOW_REQUEST_MS and elapsed * 1000 >= config.SLOW_REQUEST_MS:
+        phases = {}
+        for name, seconds in trace or []:
+            total = phases.setdefault(name, [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+        print("Slow request : " + json.dumps({
+            "route": route, "method": method, "status": status, "ms": round(elapsed * 1000, 1),
+            "phases": {name: {"count": c, "ms": round(s * 1000, 1)} for name, (c, s) in sorted(phases.items())},
+        }))
+
+
+def copy_context():
+    """Context for work handed to another thread, so its phases land in this request's trace."""
+    return contextvars.copy_context()
+
+
+ARCHIVE = "archive.json"
+
+
+def _start_time(pid):
+    """Kernel start time of ``pid`` in clock ticks since boot, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name (field 2) may contain spaces; starttime is field 22
+    return int(stat[stat.rindex(b")") + 2:].split()[19])
+
+
+_name = None   # (pid, snapshot file name) of this process
+
+
+def _snapshot_name():
+    """``<pid>-<start time>.json``: a later process that reuses the pid gets a different file."""
+    global _name
+    pid = os.getpid()
+    if _name is None or _name[0] != pid:
+        _name = (pid, f"{pid}-{_start_time(pid) or time.time_ns()}.json")
+    return _name[1]
+
+
+def flush():
+    if not config.METRICS_ENABLED:
+        return
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    tmp = os.path.join(config.METRICS_DIR, f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(_registry.snapshot(), f)
+    os.replace(tmp, os.path.join(config.METRICS_DIR, _snapshot_name()))
+
+
+def _alive(name):
+    pid, _, started = name[:-5].partition("-")
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    current = _start_time(int(pid))
+    return current is None or str(current) == started
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(histograms, counters, data):
+    for metric, series in data.get("histograms", {}).items():
+        target = histograms.setdefault(metric, {})
+        for key, values in series:
+            key = tuple(tuple(pair) for pair in key)
+            current = target.setdefault(key, [0] * len(values))
+            target[key] = [a + b for a, b in zip(current, values)]
+    for metric, series in data.get("counters", {}).items():
+        target = counters.setdefault(metric, {})
+        for key, value in series:
+            key = tuple(tuple(pair) for pair in key)
+            target[key] = target.get(key, 0) + value
+
+
+def _dump(histograms, counters):
+    return {
+        "histograms": {n: [[list(k), v] for k, v in s.items()] for n, s in histograms.items()},
+        "counters": {n: [[list(k), v] for k, v in s.items()] for n, s in counters.items()},
+    }
+
+
+def _fold_dead(dead):
+    """Add exited workers' snapshots to ARCHIVE and delete them, so the directory holds one file per live worker.
+
+    ARCHIVE lists the files it already contains, so a crash between writing it and
+    deleting them can't count a worker twice. Runs under an flock because
+    concurrent scrapes would otherwise fold the same file twice.
+    """
+    archive_path = os.path.join(config.METRICS_DIR, ARCHIVE)
+    with open(os.path.join(config.METRICS_DIR, ".archive.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _load(archive_path) or {}
+        folded = set(archive.get("folded", []))
+        histograms, counters = {}, {}
+        _add(histograms, counters, archive)
+        for name in dead:
+            if name in folded:
+                continue
+            data = _load(os.path.join(config.METRICS_DIR, name))
+            if data is not None:
+                _add(histograms, counters, data)
+                folded.add(name)
+        data = _dump(histograms, counters)
+        # Only names still on disk need remembering
+        data["folded"] = sorted(n for n in folded if os.path.exists(os.path.join(config.METRICS_DIR, n)))
+        tmp = archive_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, archive_path)
+        for name in data["folded"]:
+            try:
+                os.remove(os.path.join(config.METRICS_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def _merged():
+    names = [n for n in os.listdir(config.METRICS_DIR) if n.endswith(".json") and n != ARCHIVE]
+    dead = [n for n in names if not _alive(n)]
+    if dead:
+        _fold_dead(dead)
+    histograms, counters, gauges = {}, {}, {}
+    archive = _load(os.path.join(config.METRICS_DIR, ARCHIVE))
+    if archive:
+        _add(histograms, counters, archive)
+    for name in names:
+        if name in dead:
+            continue
+        data = _load(os.path.join(config.METRICS_DIR, name))
+        if data is None:
+            continue
+        _add(histograms, counters, data)
+        for metric, value in data.get("gauges", {}).items():
+            gauges[metric] = gauges.get(metric, 0) + value
+    return histograms, counters, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key, extra=None):
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _header(lines, name, kind):
+    help_text = HELP.get(name, (kind, name))[1]
+    lines.append(f"# HELP {PREFIX}{name} {help_text}")
+    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+
+def render():
+    """Prometheus text exposition of every worker's metrics on this host."""
+    flush()
+    histograms, counters, gauges = _merged()
+    lines = []
+    for name, series in sorted(histograms.items()):
+        _header(lines, name, "histogram")
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_labels(key, ('le', bound))} {cumulative}")
+            cumulative += values[len(BUCKETS)]
+            lines.append(f"{PREFIX}{name}_bucket{_labels(key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(key)} {values[-1]}")
+            lines.append(f"{PREFIX}{name}_count{_labels(key)} {cumulative}")
+    for name, series in sorted(counters.items()):
+        _header(lines, name, "counter")
+        for key, value in sorted(series.items()):
+            lines.append(f"{PREFIX}{name}{_labels(key)} {value}")
+    for name, value in sorted(gauges.items()):
+        _header(lines, name, "gauge")
+        lines.append(f"{PREFIX}{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def start_flusher():
+    """Write this worker's snapshot every METRICS_FLUSH_INTERVAL seconds; safe to call from every request."""
+    global _flusher
+    if _flusher is None and config.METRICS_ENABLED:
+        with _flusher_lock:
+            if _flusher is None:
+                def run():
+                    while True:
+                        time.sleep(config.METRICS_FLUSH_INTERVAL)
+                        try:
+                            flush()
+                        except Exception as e:
+                            print(f"Metrics flush failed : {e}")
+                _flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+                _flusher.start()
@@ -0,0 +1,123 @@
+"""Per-message placement results, one row per (seed address, message).
+
+A message is identified by X-GM-MSGID, or by its Message-ID header when Gmail's
+id is missing, so checking the same mailbox again updates the existing row
+instead of adding another. ``counted_folder`` records where the placement
+counters currently count the message. ``record`` returns only the difference
+since the last check: a new message, or a move between INBOX and Spam.
+"""
+from datetime import datetime
+
+import config
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS message_observations (
+    address_id INT NOT NULL,
+    message_key VARCHAR(255) NOT NULL,
+    user_id INT NULL,
+    folder VARCHAR(8) NOT NULL,
+    counted_folder VARCHAR(8) NULL,
+    sent_at DATETIME NULL,
+    sender_email VARCHAR(255) NULL,
+    sender_name VARCHAR(255) NULL,
+    subject VARCHAR(512) NULL,
+    preview VARCHAR(255) NULL,
+    search_text VARCHAR(255) NULL,
+    first_seen DATETIME NOT NULL,
+    last_seen DATETIME NOT NULL,
+    times_seen INT NOT NULL DEFAULT 1,
+    PRIMARY KEY (address_id, message_key),
+    KEY idx_message_observations_user (user_id, last_seen)
+)"""
+
+UPSERT = """INSERT INTO message_observations (address_id, message_key, user_id, folder, sent_at, sender_email,
+    sender_name, subject, preview, search_text, first_seen, last_seen) VALUES {values}
+    ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), folder = VALUES(folder), subject = VALUES(subject),
+    preview = VALUES(preview), search_text = VALUES(search_text), last_seen = VALUES(last_seen),
+    times_seen = times_seen + 1"""
+
+FOLDERS = {"inbox": "INBOX", "spam": "SPAM"}
+
+_table_ready = False
+
+
+def ensure_table(cur):
+    global _table_ready
+    if not _table_ready:
+        cur.execute(CREATE_TABLE)
+        _table_ready = True
+
+
+def _clip(value, size):
+    return value[:size] if isinstance(value, str) else value
+
+
+def rows_from_status(user_id, address_id, status, search_text, seen_at):
+    """Observation rows for the messages in one ``check_email_status`` result."""
+    rows = {}
+    for item in status.get('results') or []:
+        key = item.get('message_id')
+        folder = FOLDERS.get(item.get('type'))
+        if not key or not folder:
+            continue
+        sent_at = item.get('date')
+        rows[key] = (address_id, key, user_id, folder, sent_at.replace(tzinfo=None) if sent_at else None,
+                     _clip(item.get('sender_email'), 255), _clip(item.get('sender_name'), 255),
+                     _clip(item.get('subject'), 512), _clip(item.get('text'), 255), _clip(search_text, 255),
+                     seen_at, seen_at)
+    return list(rows.values())
+
+
+def record(cur, rows):
+    """Upsert observation rows and return counter deltas as ``(user_id, address_id, inbox, spam, seen_at)``.
+
+    The upsert locks every touched row until the caller commits, so two checks of
+    the same mailbox can't both count a message: the second one only runs after the
+    first has set ``counted_folder``. The table must already exist (``ensure_table``
+    runs at startup): creating it here would commit the caller's transaction halfway.
+    """
+    if not rows:
+        return []
+    rows = sorted(rows, key=lambda r: (r[0], r[1]))  # stable lock order between writers
+    batch = config.OBSERVATION_UPSERT_BATCH
+    deltas = {}
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        cur.execute(UPSERT.format(values=','.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))),
+                    tuple(v for row in chunk for v in row))
+        keys = tuple(v for row in chunk for v in row[:2])
+        pairs = ','.join(['(%s, %s)'] * len(chunk))
+        cur.execute(f"""SELECT address_id, user_id, folder, counted_folder FROM message_observations
+                        WHERE (address_id, message_key) IN ({pairs})
+                        AND (counted_folder IS NULL OR counted_folder <> folder) FOR UPDATE""", keys)
+        changed = cur.fetchall()
+        if not changed:
+            continue
+        for address_id, user_id, folder, counted_folder in changed:
+            d = deltas.setdefault((user_id, address_id), [0, 0])
+            d[0 if folder == "INBOX" else 1] += 1
+            if counted_folder:
+                d[0 if counted_folder == "INBOX" else 1] -= 1
+        cur.execute(f"""UPDATE message_observations SET counted_folder = folder
+                        WHERE (address_id, message_key) IN ({pairs})""", keys)
+    seen_at = rows[-1][-1]
+    return [(user_id, address_id, inbox, spam, seen_at) for (user_id, address_id), (inbox, spam) in sorted(
+        deltas.items(), key=lambda i: (i[0][0] or 0, i[0][1]))]
+
+
+def recent(cur, address_id, folder=None, limit=50):
+    where, params = "address_id = %s", [address_id]
+    if folder in FOLDERS.values():
+        where += " AND folder = %s"
+        params.append(folder)
+    cur.execute(f"""SELECT message_key, folder, sent_at, sender_email, sender_name, subject, preview, search_text,
+                    first_seen, last_seen, times_seen FROM message_observations WHERE {where}
+                    ORDER BY last_seen DESC, sent_at DESC LIMIT %s""", (*params, limit))
+    now = datetime.now()
+    results = []
+    for key, folder, sent_at, sender_email, sender_name, subject, text, search_text, first_seen, last_seen, times_seen in cur.fetchall():
+        results.append({"message_id": key, "type": folder.lower(), "date": sent_at.isoformat() if sent_at else None,
+                        "sender_email": sender_email, "sender_name": sender_name, "subject": subject, "text": text,
+                        "search": search_text, "first_seen": first_seen.isoformat(), "last_seen": last_seen.isoformat(),
+                        "times_seen": times_seen,
+                        "stale_seconds": int((now - last_seen).total_seconds())})
+    return results
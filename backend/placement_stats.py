@@ -0,0 +1,229 @@
+"""Pre-aggregated inbox/spam counters kept next to email_check_log.
+
+Every write to email_check_log goes through ``record_checks`` so the rollup tables
+stay in step inside the same transaction. Dashboard reads then touch one row per
+user (or address) instead of scanning the whole log. Hourly and daily buckets
+back the placement history charts.
+
+``inbox`` / ``spam`` count distinct messages (see observations.py): a message seen
+by ten checks counts once, and a move between folders shifts it across. ``checks``
+still counts every check.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import config
+import observations
+
+CREATE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS placement_user_counters (
+        user_id INT NOT NULL PRIMARY KEY,
+        inbox BIGINT NOT NULL DEFAULT 0,
+        spam BIGINT NOT NULL DEFAULT 0,
+        checks BIGINT NOT NULL DEFAULT 0,
+        updated_at DATETIME NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS placement_address_counters (
+        address_id INT NOT NULL PRIMARY KEY,
+        user_id INT NULL,
+        inbox BIGINT NOT NULL DEFAULT 0,
+        spam BIGINT NOT NULL DEFAULT 0,
+        checks BIGINT NOT NULL DEFAULT 0,
+        updated_at DATETIME NULL,
+        KEY idx_placement_address_counters_user (user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS placement_hourly (
+        bucket DATETIME NOT NULL,
+        user_id INT NOT NULL,
+        address_id INT NOT NULL,
+        inbox INT NOT NULL DEFAULT 0,
+        spam INT NOT NULL DEFAULT 0,
+        checks INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, bucket, address_id),
+        KEY idx_placement_hourly_address (address_id, bucket)
+    )""",
+    """CREATE TABLE IF NOT EXISTS placement_daily (
+        bucket DATETIME NOT NULL,
+        user_id INT NOT NULL,
+        address_id INT NOT NULL,
+        inbox INT NOT NULL DEFAULT 0,
+        spam INT NOT NULL DEFAULT 0,
+        checks INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, bucket, address_id),
+        KEY idx_placement_daily_address (address_id, bucket)
+    )""",
+]
+
+# Built by ``ensure_indexes`` from the backfill-placement-stats command, never on the request path:
+# on a large log the build takes minutes. MySQL has no CREATE INDEX IF NOT EXISTS, so these are
+# checked against information_schema
+LOG_INDEXES = {
+    "idx_email_check_log_user_checked": "CREATE INDEX idx_email_check_log_user_checked ON email_check_log (user_id, checked_at)",
+}
+
+BUCKETS = {
+    "hour": ("placement_hourly", "%Y-%m-%d %H:00:00", timedelta(hours=1)),
+    "day": ("placement_daily", "%Y-%m-%d 00:00:00", timedelta(days=1)),
+}
+
+INSERT_LOG = "INSERT INTO email_check_log (user_id, address_id, inbox, spam, checked_at) VALUES (%s, %s, %s, %s, %s)"
+
+UPSERT_USER = """INSERT INTO placement_user_counters (user_id, inbox, spam, checks, updated_at) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE inbox = inbox + VALUES(inbox), spam = spam + VALUES(spam),
+    checks = checks + VALUES(checks), updated_at = VALUES(updated_at)"""
+
+UPSERT_ADDRESS = """INSERT INTO placement_address_counters (address_id, user_id, inbox, spam, checks, updated_at) VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), inbox = inbox + VALUES(inbox), spam = spam + VALUES(spam),
+    checks = checks + VALUES(checks), updated_at = VALUES(updated_at)"""
+
+_tables_ready = False
+
+
+def ensure_tables(cur):
+    global _tables_ready
+    if not _tables_ready:
+        for statement in CREATE_TABLES:
+            cur.execute(statement)
+        _tables_ready = True
+
+
+def ensure_indexes(cur):
+    """Create any missing LOG_INDEXES; returns the names it built."""
+    cur.execute("""SELECT DISTINCT index_name FROM information_schema.statistics
+                   WHERE table_schema = DATABASE() AND table_name = 'email_check_log'""")
+    existing = {row[0] for row in cur.fetchall()}
+    built = []
+    for name, statement in LOG_INDEXES.items():
+        if name not in existing:
+            cur.execute(statement)
+            built.append(name)
+    return built
+
+
+def _bucket_rows(rows, fmt):
+    buckets = defaultdict(lambda: [0, 0, 0])
+    for user_id, address_id, inbox, spam, checked_at, checks in rows:
+        if isinstance(checked_at, str):
+            checked_at = datetime.strptime(checked_at, '%Y-%m-%d %H:%M:%S')
+        b = buckets[(user_id or 0, checked_at.strftime(fmt), address_id or 0)]
+        b[0] += inbox
+        b[1] += spam
+        b[2] += checks
+    return [(bucket, user_id, address_id, *v) for (user_id, bucket, address_id), v in sorted(buckets.items())]
+
+
+def record_checks(cur, rows, distinct=None):
+    """Insert ``(user_id, address_id, inbox, spam, checked_at)`` log rows and bump the counters.
+
+    ``distinct`` are the same-shaped deltas returned by ``observations.record``;
+    when given, they drive the inbox/spam counters and the log rows only add to
+    ``checks``. The caller commits, so the log and the rollups land in one transaction;
+    the tables are created at startup, since DDL here would commit it early.
+    """
+    if not rows:
+        return
+    cur.executemany(INSERT_LOG, rows)
+
+    if distinct is None:
+        counted = [(*row, 1) for row in rows]
+    else:
+        counted = [(u, a, 0, 0, t, 1) for u, a, _, _, t in rows] + [(*row, 0) for row in distinct]
+    per_user = defaultdict(lambda: [0, 0, 0, None])
+    per_address = defaultdict(lambda: [None, 0, 0, 0, None])
+    for user_id, address_id, inbox, spam, checked_at, checks in counted:
+        u = per_user[user_id]
+        u[0] += inbox
+        u[1] += spam
+        u[2] += checks
+        u[3] = max(u[3] or checked_at, checked_at)
+        a = per_address[address_id]
+        a[0] = user_id
+        a[1] += inbox
+        a[2] += spam
+        a[3] += checks
+        a[4] = max(a[4] or checked_at, checked_at)
+    # Sorted keys keep lock order stable between concurrent writers
+    cur.executemany(UPSERT_USER, [(k, *v) for k, v in sorted(per_user.items(), key=lambda i: i[0] or 0)])
+    cur.executemany(UPSERT_ADDRESS, [(k, *v) for k, v in sorted(per_address.items(), key=lambda i: i[0] or 0)])
+    for table, fmt, _ in BUCKETS.values():
+        cur.executemany(f"""INSERT INTO {table} (bucket, user_id, address_id, inbox, spam, checks) VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE inbox = inbox + VALUES(inbox), spam = spam + VALUES(spam), checks = checks + VALUES(checks)""",
+                        _bucket_rows(counted, fmt))
+
+
+# Checks come from the log, distinct inbox/spam messages from message_observations
+COUNTED_SOURCE = """SELECT user_id, address_id, 0 AS inbox, 0 AS spam, 1 AS checks, checked_at AS at
+        FROM email_check_log WHERE checked_at IS NOT NULL
+    UNION ALL
+    SELECT user_id, address_id, counted_folder = 'INBOX', counted_folder = 'SPAM', 0, first_seen
+        FROM message_observations WHERE counted_folder IS NOT NULL"""
+
+
+def record_results(cur, results, search_text, checked_at=None):
+    """Log ``[(user_id, address_id, status)]`` check results and their per-message observations.
+
+    Timed-out and skipped checks are left out. The caller commits.
+    """
+    checked_at = checked_at or datetime.now().replace(microsecond=0)
+    rows, seen = [], []
+    for user_id, address_id, status in results:
+        if status['type'] in ('timeout', 'skipped'):
+            continue
+        rows.append((user_id, address_id, status['inbox'], status['spam'], checked_at))
+        seen.extend(observations.rows_from_status(user_id, address_id, status, search_text, checked_at))
+    if rows:
+        record_checks(cur, rows, distinct=observations.record(cur, seen))
+
+
+def rebuild(cur):
+    """Recompute every rollup table from email_check_log and message_observations.
+
+    Used by reset and the backfill command. Log rows written before message
+    observations existed only contribute to ``checks``.
+    """
+    ensure_tables(cur)
+    observations.ensure_table(cur)
+    cur.execute("DELETE FROM placement_user_counters")
+    cur.execute("DELETE FROM placement_address_counters")
+    cur.execute(f"""INSERT INTO placement_user_counters (user_id, inbox, spam, checks, updated_at)
+        SELECT user_id, SUM(inbox), SUM(spam), SUM(checks), MAX(at)
+        FROM ({COUNTED_SOURCE}) AS counted WHERE user_id IS NOT NULL GROUP BY user_id""")
+    cur.execute(f"""INSERT INTO placement_address_counters (address_id, user_id, inbox, spam, checks, updated_at)
+        SELECT address_id, MAX(user_id), SUM(inbox), SUM(spam), SUM(checks), MAX(at)
+        FROM ({COUNTED_SOURCE}) AS counted WHERE address_id IS NOT NULL GROUP BY address_id""")
+    for table, fmt, _ in BUCKETS.values():
+        cur.execute(f"DELETE FROM {table}")
+        cur.execute(f"""INSERT INTO {table} (bucket, user_id, address_id, inbox, spam, checks)
+            SELECT DATE_FORMAT(at, %s), IFNULL(user_id, 0), IFNULL(address_id, 0), SUM(inbox), SUM(spam), SUM(checks)
+            FROM ({COUNTED_SOURCE}) AS counted
+            GROUP BY DATE_FORMAT(at, %s), IFNULL(user_id, 0), IFNULL(address_id, 0)""", (fmt, fmt))
+
+
+def pick_bucket(start, end, bucket):
+    """Resolve ``auto`` to hourly data for short ranges and daily buckets otherwise."""
+    if bucket in BUCKETS:
+        return bucket
+    return "hour" if end - start <= timedelta(days=config.HISTORY_AUTO_HOURLY_DAYS) else "day"
+
+
+def history(cur, start, end, bucket, user_id=None, address_id=None):
+    """Return zero-filled ``[{bucket, inbox, spam, checks, ratio}]`` for ``[start, end)``."""
+    table, fmt, step = BUCKETS[bucket]
+    ensure_tables(cur)
+    start = datetime.strptime(start.strftime(fmt), '%Y-%m-%d %H:%M:%S')
+    if address_id is not None:
+        where, key = "address_id = %s", address_id
+    else:
+        where, key = "user_id = %s", user_id
+    cur.execute(f"""SELECT bucket, SUM(inbox), SUM(spam), SUM(checks) FROM {table}
+                    WHERE {where} AND bucket >= %s AND bucket < %s GROUP BY bucket""", (key, start, end))
+    found = {row[0]: row[1:] for row in cur.fetchall()}
+
+    points = []
+    current = start
+    while current < end:
+        inbox, spam, checks = (int(v or 0) for v in found.get(current, (0, 0, 0)))
+        points.append({"bucket": current.isoformat(), "inbox": inbox, "spam": spam, "checks": checks,
+                       "ratio": round(inbox * 100 / (inbox + spam), 1) if inbox + spam else None})
+        current += step
+    return points
@@ -0,0 +1,184 @@
+import binascii
+import codecs
+import re
+from email.parser import BytesHeaderParser
+from html.parser import HTMLParser
+
+import config
+
+_header_parser = BytesHeaderParser()
+_whitespace = re.compile(r'\s+')
+
+
+class _TextCollector(HTMLParser):
+    """Collects visible text from an HTML fragment, skipping script/style/head."""
+
+    SKIP = {'script', 'style', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.length = 0
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag in ('br', 'p', 'div', 'tr', 'li'):
+            self._add(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._add(data)
+
+    def _add(self, data):
+        self.parts.append(data)
+        self.length += len(data)
+
+    def text(self):
+        return _whitespace.sub(' ', ''.join(self.parts)).strip()
+
+
+def html_to_text(html, budget=None):
+    """Strip tags from ``html`` and return at most ``budget`` characters of visible text."""
+    collector = _TextCollector()
+    collector.feed(html or '')
+    collector.close()
+    text = collector.text()
+    return text[:budget] if budget else text
+
+
+def _find_header_end(raw, start, end):
+    # Walk line by line so a missing CRLF never makes us scan a whole attachment
+    pos = start
+    while pos < end:
+        nl = raw.find(b'\n', pos, end)
+        if nl == -1:
+            break
+        if nl == pos or (nl == pos + 1 and raw[pos:pos + 1] == b'\r'):
+            return pos, nl + 1
+        pos = nl + 1
+    return end, end
+
+
+def _iter_lines(raw, start, end):
+    while start < end:
+        nl = raw.find(b'\n', start, end)
+        stop = end if nl == -1 else nl + 1
+        yield raw[start:stop]
+        start = stop
+
+
+class _LeafDecoder:
+    """Incrementally undoes transfer encoding and charset for one MIME leaf."""
+
+    def __init__(self, charset, encoding):
+        try:
+            self._text = codecs.getincrementaldecoder(charset)(errors='replace')
+        except LookupError:
+            self._text = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._encoding = encoding
+        self._pending = b''
+
+    def feed(self, line):
+        if self._encoding == 'base64':
+            self._pending += b''.join(line.split())
+            usable = len(self._pending) - len(self._pending) % 4
+            chunk, self._pending = self._pending[:usable], self._pending[usable:]
+            try:
+                data = binascii.a2b_base64(chunk)
+            except binascii.Error:
+                data = b''
+        elif self._encoding == 'quoted-printable':
+            data = binascii.a2b_qp(line)
+        else:
+            data = line
+        return self._text.decode(data)
+
+
+def _decode_leaf(raw, start, end, content_type, charset, encoding, budget):
+    decoder = _LeafDecoder(charset, encoding)
+    if content_type == 'text/html':
+        collector = _TextCollector()
+        for line in _iter_lines(raw, start, end):
+            collector.feed(decoder.feed(line))
+            if collector.length >= budget * 2:
+                break
+        collector.close()
+        return collector.text()[:budget]
+
+    parts = []
+    length = 0
+    for line in _iter_lines(raw, start, end):
+        text = decoder.feed(line)
+        parts.append(text)
+        length += len(text)
+        if length >= budget:
+            break
+    return ''.join(parts).replace('\r\n', '\n')[:budget]
+
+
+def _scan(raw, start, end, budget, state):
+    """Walk one MIME entity in ``raw[start:end]``.
+
+    Returns the preview text as soon as a text/plain leaf is decoded. The first
+    text/html leaf is remembered in ``state`` so it can be used as a fallback.
+    """
+    header_end, body_start = _find_header_end(raw, start, end)
+    headers = _header_parser.parsebytes(raw[start:header_end])
+    content_type = headers.get_content_type()
+
+    if content_type.startswith('multipart/'):
+        boundary = headers.get_param('boundary')
+        if not boundary:
+            return None
+        delimiter = b'--' + boundary.encode('ascii', 'replace')
+        pos = raw.find(delimiter, body_start, end)
+        while pos != -1:
+            after = pos + len(delimiter)
+            if raw[after:after + 2] == b'--':
+                break
+            part_start = raw.find(b'\n', after, end)
+            if part_start == -1:
+                break
+            part_start += 1
+            nxt = raw.find(b'\n' + delimiter, part_start, end)
+            part_end = end if nxt == -1 else nxt
+            if raw[part_end - 1:part_end] == b'\r':
+                part_end -= 1
+            text = _scan(raw, part_start, part_end, budget, state)
+            if text is not None:
+                return text
+            pos = -1 if nxt == -1 else nxt + 1
+        return None
+
+    if headers.get_content_disposition() == 'attachment':
+        return None
+    encoding = (headers.get('Content-Transfer-Encoding') or '7bit').strip().lower()
+    charset = headers.get_content_charset() or 'utf-8'
+    if content_type == 'text/plain':
+        return _decode_leaf(raw, body_start, end, content_type, charset, encoding, budget)
+    if content_type == 'text/html' and 'html' not in state:
+        state['html'] = (body_start, end, charset, encoding)
+    return None
+
+
+def extract_preview(raw, budget=None):
+    """Return up to ``budget`` characters of preview text from a raw RFC822 message.
+
+    Stops at the first text/plain part and falls back to the stripped text of the
+    first text/html part. Nothing past the budget is transfer-decoded or parsed.
+    """
+    budget = budget or config.PREVIEW_MAX_CHARS
+    state = {}
+    text = _scan(raw, 0, len(raw), budget, state)
+    if text is not None:
+        return text
+    if 'html' in state:
+        start, end, charset, encoding = state['html']
+        return _decode_leaf(raw, start, end, 'text/html', charset, encoding, budget)
+    return ''
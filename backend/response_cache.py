@@ -0,0 +1,43 @@
+"""Cached bodies of read-mostly listings, keyed per user and request.
+
+Entries use the same versioned TTL cache as sessions, with their own shared
+counter. Any write that can change a cached listing calls ``invalidate()``, and
+every worker then drops its entries on the next read. The TTL covers writes
+made by anything that does not bump the counter.
+
+Each entry carries an ETag computed from its body. A client that sends it back in
+``If-None-Match`` gets a 304 with no query and no body.
+"""
+import hashlib
+import threading
+
+import config
+from session_cache import SessionCache, SharedCounter
+
+
+class Entry:
+    __slots__ = ("body", "mimetype", "etag")
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SessionCache(SharedCounter(config.RESPONSE_VERSION_PATH),
+                                      maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+    return _cache
+
+
+def invalidate():
+    if config.RESPONSE_CACHE_ENABLED:
+        get_cache().invalidate()
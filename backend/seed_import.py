@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from imapclient import IMAPClient
+from imapclient.exceptions import LoginError
+
+import config
+
+_email_re = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.SEED_IMPORT_WORKERS,
+                                               thread_name_prefix="seed-import")
+    return _executor
+
+
+def parse_rows(body, content_type):
+    """Return ``[(email, password)]`` from a JSON or CSV upload.
+
+    JSON is a list of ``{"email", "password"}`` objects (optionally under an
+    ``"accounts"`` key). CSV may have an ``email,password`` header row or be two
+    bare columns. Raises ValueError for anything else.
+    """
+    text = body.decode('utf-8-sig') if isinstance(body, bytes) else body
+    if 'json' in (content_type or '') or text.lstrip().startswith(('[', '{')):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get('accounts')
+        if not isinstance(data, list):
+            raise ValueError("Expected a list of accounts")
+        return [((item.get('email') or '').strip(), item.get('password') or '') if isinstance(item, dict) else ('', '')
+                for item in data]
+
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if rows and rows[0] and rows[0][0].strip().lower() == 'email':
+        rows = rows[1:]
+    return [(row[0].strip(), row[1].strip() if len(row) > 1 else '') for row in rows]
+
+
+def validate_login(email, password):
+    """Try a login on a throwaway connection; imported accounts aren't checked yet, so nothing is pooled."""
+    try:
+        client = IMAPClient(config.IMAP_HOST, port=config.IMAP_PORT, ssl=config.IMAP_SSL, timeout=config.IMAP_TIMEOUT)
+        try:
+            client.login(email, password)
+        finally:
+            try:
+                client.logout()
+            except Exception:
+                pass
+    except LoginError:
+        return 'auth_failed'
+    except Exception as e:
+        print(f"Seed login check failed for {email} : {e}")
+        return 'unreachable'
+    return 'ok'
+
+
+def validate_logins(accounts, timeout=None):
+    """Check ``[(email, password)]`` concurrently; returns a login status per account, in order."""
+    timeout = timeout or config.BATCH_CHECK_ACCOUNT_TIMEOUT
+    futures = [get_executor().submit(validate_login, email, password) for email, password in accounts]
+    statuses = []
+    for future in futures:
+        try:
+            statuses.append(future.result(timeout=timeout))
+        except Exception:
+            statuses.append('timeout')
+    return statuses
+
+
+def screen_rows(cur, user_id, rows):
+    """Check rows for shape, duplicates inside the upload and addresses the user already has.
+
+    Returns ``(report, candidates)``: the per-row report and the indexes still to import.
+    """
+    report = [{"row": i + 1, "email": email, "status": None} for i, (email, _) in enumerate(rows)]
+    seen = set()
+    for entry, (email, password) in zip(report, rows):
+        if not email or not password or not _email_re.match(email):
+            entry["status"] = "invalid"
+        elif email.lower() in seen:
+            entry["status"] = "duplicate"
+        seen.add(email.lower())
+    candidates = [i for i, entry in enumerate(report) if entry["status"] is None]
+    return report, _drop_existing(cur, user_id, rows, report, candidates)
+
+
+def _drop_existing(cur, user_id, rows, report, candidates):
+    existing = set()
+    for start in range(0, len(candidates), config.SEED_IMPORT_INSERT_BATCH):
+        chunk = [rows[i][0] for i in candidates[start:start + config.SEED_IMPORT_INSERT_BATCH]]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cur.execute(f"SELECT email FROM check_email_address WHERE user_id = %s AND email IN ({placeholders})",
+                    (user_id, *chunk))
+        existing.update(row[0].lower() for row in cur.fetchall())
+    for i in candidates:
+        if rows[i][0].lower() in existing:
+            report[i]["status"] = "exists"
+    return [i for i in candidates if report[i]["status"] is None]
+
+
+def validate_candidates(rows, report, candidates):
+    """Try the candidates' IMAP logins in parallel; returns the ones that logged in. No DB access."""
+    for i, login in zip(candidates, validate_logins([rows[i] for i in candidates])):
+        if login != 'ok':
+            report[i]["status"] = login
+    return [i for i in candidates if report[i]["status"] is None]
+
+
+def insert_accounts(cur, user_id, rows, report, candidates):
+    """Insert the candidates with multi-row INSERTs and fill in their report entries; the caller commits.
+
+    Addresses are re-checked first, since login validation may have run long
+    enough for another import to add some of them.
+    """
+    candidates = _drop_existing(cur, user_id, rows, report, candidates)
+    for start in range(0, len(candidates), config.SEED_IMPORT_INSERT_BATCH):
+        chunk = candidates[start:start + config.SEED_IMPORT_INSERT_BATCH]
+        cur.execute("INSERT INTO check_email_address (email, password, user_id) VALUES "
+                    + ','.join(['(%s, %s, %s)'] * len(chunk)),
+                    tuple(v for i in chunk for v in (rows[i][0], rows[i][1], user_id)))
+        # Auto-increment ids of a multi-row insert are not guaranteed to be contiguous, so look them up
+        emails = [rows[i][0] for i in chunk]
+        cur.execute(f"SELECT id, email FROM check_email_address WHERE user_id = %s AND email IN ({','.join(['%s'] * len(emails))})",
+                    (user_id, *emails))
+        ids = {email.lower(): id for id, email in cur.fetchall()}
+        for i in chunk:
+            report[i]["status"] = "imported"
+            report[i]["id"] = ids.get(rows[i][0].lower())
+    return report
+
+
+def import_accounts(cur, user_id, rows, validate=True):
+    """Screen, optionally validate, and insert seed accounts in one go; returns the per-row report."""
+    report, candidates = screen_rows(cur, user_id, rows)
+    if validate and candidates:
+        candidates = validate_candidates(rows, report, candidates)
+    return insert_accounts(cur, user_id, rows, report, candidates)
+
+
+def summarize(report):
+    summary = {}
+    for entry in report:
+        summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+    return summary
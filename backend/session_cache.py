@@ -0,0 +1,106 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class SharedCounter:
+    """A 64-bit counter in a memory-mapped file, shared by every worker process on the host.
+
+    Reading is a single unaligned load from the mapping, so checking it on every
+    request costs nothing compared to a MySQL round-trip. Bumps are serialised
+    with an flock on the same file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < 8:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(fd).st_size < 8:
+                        os.ftruncate(fd, 8)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def value(self):
+        return struct.unpack_from('<Q', self._map, 0)[0]
+
+    def bump(self):
+        with open(self.path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                value = self.value() + 1
+                struct.pack_into('<Q', self._map, 0, value)
+                self._map.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return value
+
+
+class SessionCache:
+    """Bounded TTL cache of session token -> user context, i.e. the MySQL lookup only.
+
+    It does not replace verifying the token: callers check the JWT signature on
+    every request before using an entry.
+
+    An entry is only trusted while the shared version counter still has the value
+    it had when the entry was stored; login, logout and user edits bump it so every
+    worker drops its cached sessions on the next request.
+    """
+
+    def __init__(self, counter, maxsize=None, ttl=None):
+        self.counter = counter
+        self.maxsize = maxsize or config.SESSION_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.SESSION_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        version = self.counter.value()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, entry_version, expires_at = entry
+            if entry_version != version or expires_at < now:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token, user, version):
+        """Store ``user`` for ``token``; ``version`` must be read before the DB lookup."""
+        with self._lock:
+            self._entries[token] = (user, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self.counter.bump()
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SessionCache(SharedCounter(config.SESSION_VERSION_PATH))
+    return _cache
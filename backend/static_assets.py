@@ -0,0 +1,112 @@
+"""In-memory manifest of the React build, with precompressed variants.
+
+``flask compress-static`` writes ``.br`` and ``.gz`` files next to each compressible
+asset at build time. Each worker scans the build directory once, on its first
+static request, and remembers every file's ETag, content type and variants, so
+serving an asset never hashes or stats anything. Files under ``static/`` carry a
+content hash in their name (``main.355b16be.js``). They never change, so they
+can be cached for a year. ``index.html`` and the other top-level files keep
+their names across builds and are revalidated by ETag.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+import config
+
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE = {".js", ".css", ".html", ".json", ".map", ".txt", ".svg", ".ico"}
+FINGERPRINT = re.compile(r'\.[0-9a-f]{8,}\.')
+
+mimetypes.add_type("application/json", ".map")
+
+
+class Asset:
+    __slots__ = ("path", "content_type", "etag", "immutable", "variants")
+
+    def __init__(self, path, content_type, etag, immutable, variants):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+        self.immutable = immutable
+        self.variants = variants    # encoding -> path of the precompressed file
+
+    def choose(self, accept_encodings):
+        """``(encoding, path)`` of the best variant the client accepts, or ``(None, path)``."""
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding, self.variants[encoding]
+        return None, self.path
+
+
+def _digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _sources(root):
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                yield os.path.join(folder, name)
+
+
+def build_manifest(root):
+    manifest = {}
+    for path in _sources(root):
+        rel = os.path.relpath(path, root).replace(os.sep, "/")
+        mtime = os.path.getmtime(path)
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            # A variant older than its source is left over from a previous build
+            if os.path.exists(path + suffix) and os.path.getmtime(path + suffix) >= mtime:
+                variants[encoding] = path + suffix
+        manifest[rel] = Asset(path, mimetypes.guess_type(path)[0] or "application/octet-stream", _digest(path),
+                              rel.startswith("static/") and bool(FINGERPRINT.search(os.path.basename(rel))), variants)
+    return manifest
+
+
+def compress(root):
+    """Write ``.gz`` (and ``.br`` when the brotli package is installed) next to every compressible asset."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("brotli is not installed, writing gzip variants only")
+    written = 0
+    for path in _sources(root):
+        if os.path.splitext(path)[1] not in COMPRESSIBLE or os.path.getsize(path) < config.STATIC_COMPRESS_MIN_BYTES:
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        for suffix, body in variants.items():
+            # Only keep a variant that is actually smaller; otherwise the original is served
+            if len(body) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(body)
+                written += 1
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return written
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest(root):
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = build_manifest(root)
+    return _manifest
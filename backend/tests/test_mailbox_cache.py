@@ -0,0 +1,46 @@
+import unittest
+
+import mailbox_cache
+
+
+class FakeClient:
+    """Answers UID SEARCH from a list of UIDs, every message matching the criteria."""
+
+    def __init__(self, uids):
+        self.uids = list(uids)
+
+    def search(self, criteria):
+        if criteria[0] == 'UID':
+            low = int(criteria[1].split(':')[0])
+            # "n:*" always includes the highest UID, even when it is below n
+            return [u for u in self.uids if u >= low] or self.uids[-1:]
+        return list(self.uids)
+
+
+def select_info(uidnext, exists):
+    return {b'UIDVALIDITY': 1, b'UIDNEXT': uidnext, b'EXISTS': exists}
+
+
+class MatchingUidsTest(unittest.TestCase):
+    def test_uid_arriving_between_select_and_search_is_not_duplicated(self):
+        entry = mailbox_cache.FolderCache()
+        client = FakeClient([1, 2])
+        # SELECT sees UIDNEXT 3, then UID 3 arrives before the SEARCH runs
+        info = select_info(uidnext=3, exists=2)
+        client.uids.append(3)
+        self.assertEqual(entry.matching_uids(client, info, '', ['ALL']), [1, 2, 3])
+
+        client.uids.append(4)
+        uids = entry.matching_uids(client, select_info(uidnext=5, exists=4), '', ['ALL'])
+        self.assertEqual(uids, [1, 2, 3, 4])
+
+    def test_unchanged_folder_is_answered_from_cache(self):
+        entry = mailbox_cache.FolderCache()
+        client = FakeClient([1, 2])
+        entry.matching_uids(client, select_info(uidnext=3, exists=2), '', ['ALL'])
+        client.uids.append(99)  # would show up if the cache searched again
+        self.assertEqual(entry.matching_uids(client, select_info(uidnext=3, exists=2), '', ['ALL']), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()